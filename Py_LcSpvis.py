@@ -1,5 +1,210 @@
+import functools
 import sys
-import clr
+import threading
+import time
+
+import numpy as np
+
+
+MEASUREDATE_ITEMS = {
+    0: 'total_power',
+    1: 'flux',
+    2: 'x',
+    3: 'y',
+    4: 'z',
+    5: 'cx',
+    6: 'cy',
+    7: 'u',
+    8: 'v',
+    9: 'u_prime',
+    10: 'v_prime',
+    11: 'cct',
+    12: 'duv',
+    13: 'peak_wavelength',
+    14: 'fwhm',
+    15: 'peak_energy',
+    16: 'peak_pixel',
+    17: 'peak_pixel_wavelength',
+    18: 'peak_pixel_energy',
+    19: 'has_dominant',
+    20: 'dominant_wavelength',
+    21: 'purity',
+    31: 'ra',
+    **{32 + i: 'r%d' % (i + 1) for i in range(15)},
+    801: 'wavelength',
+    802: 'spectrum',
+    901: 'integration',
+    902: 'averaging',
+    903: 'saturation',
+    904: 'test_time',
+    905: 'usage_mode',
+}
+
+# StdSpectralData property (and array position for R1~R15) behind every item code.
+_STD_FIELDS = {
+    'total_power': ('d_TotalPower', None),
+    'flux': ('d_Intensity', None),
+    'x': ('d_X', None),
+    'y': ('d_Y', None),
+    'z': ('d_Z', None),
+    'cx': ('d_Cx', None),
+    'cy': ('d_Cy', None),
+    'u': ('d_U', None),
+    'v': ('d_V', None),
+    'u_prime': ('d_Uc', None),
+    'v_prime': ('d_Vc', None),
+    'cct': ('d_CCT', None),
+    'duv': ('d_Ds', None),
+    'peak_wavelength': ('d_PeakWave', None),
+    'fwhm': ('d_PeakHalf', None),
+    'peak_energy': ('d_PeakCount', None),
+    'peak_pixel': ('d_PeakPix', None),
+    'peak_pixel_wavelength': ('d_PeakPixWave', None),
+    'peak_pixel_energy': ('d_PeakPixCount', None),
+    'has_dominant': ('d_HasDominant', None),
+    'dominant_wavelength': ('d_Dominant', None),
+    'purity': ('d_Pure', None),
+    'ra': ('d_Ra', None),
+    **{'r%d' % (i + 1): ('d_CRI', i) for i in range(15)},
+    'wavelength': ('d_Wavelengths', None),
+    'spectrum': ('d_Spectrums', None),
+    'integration': ('d_IntegrationTime', None),
+    'averaging': ('d_Averaging', None),
+    'saturation': ('d_Saturation', None),
+    'test_time': ('d_CostTime', None),
+    'usage_mode': ('d_UsageMode', None),
+}
+
+
+# Active backend (LC_SpFunc_XS instance or a stand-in) and its StdSpectralData type, see use_backend.
+LC = None
+LC_DATA = None
+
+
+class ClrBackend:
+    """
+    Backend of the LcSpvis .net library. The CLR and LcSpvis_XS are loaded on the first
+    call, not at import, after that the library instance replaces this object as LC so
+    calls go straight to the library.
+    """
+    def __init__(self, i_path):
+        """
+        :param i_path:  String, directory containing LcSpvis_XS.dll.
+        """
+        self.path = i_path
+        self.library = None
+
+    def load(self):
+        """
+        Load the .net runtime and the library.
+        :return:  LC_SpFunc_XS instance.
+        """
+        if self.library is None:
+            import clr
+
+            sys.path.append(self.path)
+            clr.AddReference("LcSpvis_XS")
+
+            from LcSpvis import LC_SpFunc_XS, StdSpectralData
+            from System import IntPtr as _IntPtr
+            from System.Runtime.InteropServices import Marshal as _Marshal
+
+            global LC, LC_DATA, IntPtr, Marshal
+            self.library = LC_SpFunc_XS()
+            self.data = StdSpectralData
+            IntPtr = _IntPtr
+            Marshal = _Marshal
+            if LC is self:
+                LC = self.library
+                LC_DATA = StdSpectralData
+        return self.library
+
+    def StdSpectralData(self):
+        self.load()
+        return self.data()
+
+    def __getattr__(self, i_name):
+        if i_name.startswith('__') or i_name in ('library', 'data', 'path'):
+            raise AttributeError(i_name)
+        return getattr(self.load(), i_name)
+
+
+def use_backend(i_backend):
+    """
+    Route all LC_* calls to i_backend.
+    :param i_backend:  Object with the methods of LcSpvis.LC_SpFunc_XS and a StdSpectralData
+    attribute, e.g. ClrBackend or lc_simulator.Simulator.
+    :return:  The backend.
+    """
+    global LC, LC_DATA
+    LC = i_backend
+    LC_DATA = i_backend.StdSpectralData
+    return i_backend
+
+
+# Preallocated NumPy buffers, keyed by (device index, buffer name).
+_BUFFERS = {}
+
+
+def _buffer(i_index, i_name, i_size):
+    """
+    :return:  Pooled float64 buffer of i_size elements, allocated once per device and name.
+    """
+    key = (i_index, i_name)
+    out = _BUFFERS.get(key)
+    if out is None or out.size != i_size:
+        out = _BUFFERS[key] = np.empty(i_size, dtype=np.float64)
+    return out
+
+
+def _copy_array(i_source, i_out):
+    """
+    Copy a .net double[] (or any sequence) into i_out with a single bulk memory copy.
+    :return:  View of i_out holding the copied values.
+    """
+    size = len(i_source)
+    if i_out.size < size or i_out.dtype != np.float64 or not i_out.flags.c_contiguous:
+        raise ValueError('Output buffer must be a contiguous float64 array of at least %d elements' % size)
+    out = i_out[:size]
+    if hasattr(i_source, 'Length'):
+        Marshal.Copy(i_source, 0, IntPtr(out.ctypes.data), size)
+    else:
+        out[:] = i_source
+    return out
+
+
+class MeasureResult:
+    """
+    All photometric and colorimetric items of one measurement, read from a single
+    LC_MeasureDate(int, ref StdSpectralData) call.
+    Attribute names are the values of MEASUREDATE_ITEMS, so result.cx holds the same
+    value as lc_measuredate(index, 5, 0, [])[1].
+    """
+    __slots__ = tuple(MEASUREDATE_ITEMS.values())
+
+    def __init__(self, i_data):
+        """
+        :param i_data:  StdSpectralData filled by the .net library.
+        """
+        for name, (attribute, position) in _STD_FIELDS.items():
+            value = getattr(i_data, attribute)
+            setattr(self, name, value if position is None else value[position])
+
+    def item(self, i_mpitestdataitem):
+        """
+        :param i_mpitestdataitem:  Integer, item code as used by lc_measuredate.
+        :return:  Value of the selected item.
+        """
+        return getattr(self, MEASUREDATE_ITEMS[i_mpitestdataitem])
+
+    def as_dict(self, i_items=None):
+        """
+        :param i_items:  Iterable of item codes, all items if None.
+        :return:  Dictionary item code -> value.
+        """
+        if i_items is None:
+            i_items = MEASUREDATE_ITEMS
+        return {item: self.item(item) for item in i_items}
 
 
 class BlockingFunctions:
@@ -34,13 +239,7 @@ class BlockingFunctions:
     application program is initialized, it should select the spectrometer to be used.
     """
     def __init__(self, path):
-        sys.path.append(path)
-        clr.AddReference("LcSpvis_XS")
-
-        from LcSpvis import LC_SpFunc_XS
-
-        global LC
-        LC = LC_SpFunc_XS()
+        use_backend(ClrBackend(path))
 
     @staticmethod
     def lc_init():
@@ -162,7 +361,7 @@ class BlockingFunctions:
         ERR_INVALID_ACTIVATE = -2
         ERR_UNKNOWN = -99
         """
-        return LC.LC_OneDark(i_index, i_integration, i_averaging)
+        return LC.LC_OnceDark(i_index, i_integration, i_averaging)
 
     @staticmethod
     def lc_autointegration(i_index, i_saturation, i_integration, i_averaging):
@@ -264,6 +463,26 @@ class BlockingFunctions:
         """
         return LC.LC_GetSpectrum(i_index, i_darkmode, i_integration, i_averaging, i_spectrum)
 
+    @staticmethod
+    def lc_getspectrum_np(i_index, i_darkmode, i_integration, i_averaging, i_out=None):
+        """
+        NumPy variant of lc_getspectrum. The .net array is transferred with one bulk memory
+        copy instead of element by element.
+        :param i_index:  Integer, the selected spectrometer's index
+        :param i_darkmode:  Integer, mode selection (see lc_getspectrum)
+        :param i_integration:  Double precision floating-point, integration time
+        :param i_averaging:  Integer, number of averages
+        :param i_out:  Contiguous float64 ndarray receiving the spectrum. If None, a buffer
+        allocated once per device is used and overwritten by the next call.
+        :return:  Tuple (return code, ndarray view with the spectral response values)
+        """
+        ret, spectrum = LC.LC_GetSpectrum(i_index, i_darkmode, i_integration, i_averaging, [])
+        if ret != 0:
+            return ret, None
+        if i_out is None:
+            i_out = _buffer(i_index, 'spectrum', len(spectrum))
+        return ret, _copy_array(spectrum, i_out)
+
     @staticmethod
     def lc_almp(i_index, i_darkmode, i_integration, i_averaging, i_almpsp, i_almpwave):
         """
@@ -287,7 +506,7 @@ class BlockingFunctions:
         ERR_INVALID_ARRAY = -14
         ERR_UNKNOWN = -99
         """
-        return LC.LC_ALMP(i_index, i_darkmode, i_integration, i_averaging, i_almpsp, i_almpwave)
+        return LC.LC_Almp(i_index, i_darkmode, i_integration, i_averaging, i_almpsp, i_almpwave)
 
     @staticmethod
     def lc_readfbr(i_index, i_file):
@@ -411,6 +630,49 @@ class BlockingFunctions:
         """
         return LC.LC_MeasureDate(i_index, i_mpitestdataitem, i_data, i_datearray)
 
+    @staticmethod
+    def lc_measuredate_np(i_index, i_mpitestdataitem, i_out=None):
+        """
+        NumPy variant of lc_measuredate for the array items 801 and 802. The .net array is
+        transferred with one bulk memory copy instead of element by element.
+        :param i_index:  Integer, the selected spectrometer's index
+        :param i_mpitestdataitem:  Integer, 801 - Spectral wavelength, 802 - Spectral response value
+        :param i_out:  Contiguous float64 ndarray receiving the values. If None, a buffer
+        allocated once per device and item is used and overwritten by the next call.
+        :return:  Tuple (return code, ndarray view with the values)
+        """
+        if i_mpitestdataitem not in (801, 802):
+            raise ValueError('Only items 801 and 802 return arrays')
+        ret, _, values = LC.LC_MeasureDate(i_index, i_mpitestdataitem, 0, [])
+        if ret != 0:
+            return ret, None
+        if i_out is None:
+            i_out = _buffer(i_index, i_mpitestdataitem, len(values))
+        return ret, _copy_array(values, i_out)
+
+    @staticmethod
+    def lc_measuredateall(i_index, i_items=None):
+        """
+        To read every test data item of the last measurement in one call, instead of one
+        lc_measuredate call per item.
+        :param i_index:  Integer, the selected spectrometer's index
+        :param i_items:  Iterable of item codes (see lc_measuredate). If None the whole
+        MeasureResult is returned, otherwise a dictionary item code -> value.
+        :return:  Tuple (return code, MeasureResult or dictionary), the second value is None
+        on failure.
+        Success：ERR_SUCCESS = 0
+        Failure：ERR_INDEX_EXCEED_LIMIT = -19
+        ERR_INVALID_ACTIVATE = -2
+        ERR_UNKNOWN = -99
+        """
+        ret, data = LC.LC_MeasureDate(i_index, LC_DATA())
+        if ret != 0:
+            return ret, None
+        result = MeasureResult(data)
+        if i_items is None:
+            return ret, result
+        return ret, result.as_dict(i_items)
+
     @staticmethod
     def checkcaserror(i_index, i_errorinformation):
         """
@@ -422,4 +684,249 @@ class BlockingFunctions:
         Failure：ERR_INDEX_EXCEED_LIMIT = -19
         ERR_UNKNOWN = -99
         """
-        return LC.LC_CheckCaSerror(i_index, i_errorinformation)
+        return LC.CheckCASError(i_index, i_errorinformation)
+
+
+# Reentrant locks serializing the calls of one device index, shared by every Spectrometer
+# handle and by AsyncFunctions.
+_DEVICE_LOCKS = {}
+_DEVICE_LOCKS_LOCK = threading.Lock()
+
+
+def _device_lock(i_index):
+    """
+    :return:  Lock of a device index, the same object for all callers.
+    """
+    with _DEVICE_LOCKS_LOCK:
+        return _DEVICE_LOCKS.setdefault(i_index, threading.RLock())
+
+
+def _locked(i_index, i_function, *args):
+    with _device_lock(i_index):
+        return i_function(i_index, *args)
+
+
+class DeviceLocks:
+    """
+    Mixin for helpers guarding their state with self.lock: device_lock(i_index) serializes
+    the work of the helper on one device without blocking it on the others.
+    """
+    def device_lock(self, i_index):
+        """
+        :return:  Lock of the device index in device_locks, created on first use.
+        """
+        with self.lock:
+            return vars(self).setdefault('device_locks', {}).setdefault(i_index, threading.Lock())
+
+
+# Single worker executors, one per device index, used by AsyncFunctions.
+_EXECUTORS = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+
+def _executor(i_index):
+    # Imported on first use, asyncio and concurrent.futures are a large share of the import time.
+    from concurrent.futures import ThreadPoolExecutor
+
+    with _EXECUTORS_LOCK:
+        executor = _EXECUTORS.get(i_index)
+        if executor is None:
+            executor = _EXECUTORS[i_index] = ThreadPoolExecutor(max_workers=1,
+                                                                thread_name_prefix='LcSpvis-%d' % i_index)
+        return executor
+
+
+async def _run(i_index, i_timeout, i_function, *args):
+    """
+    Run a blocking function on the device executor. Calls to one device index are executed
+    one after another, also against Spectrometer handles of that index, calls to different
+    indexes run concurrently.
+    A timeout or cancellation stops the waiting only, the library call itself cannot be
+    interrupted and still finishes before the next call of that device starts.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor(i_index), functools.partial(_locked, i_index, i_function, *args))
+    return await asyncio.wait_for(future, i_timeout)
+
+
+class AsyncFunctions:
+    """
+    asyncio counterpart of BlockingFunctions for the long running calls. Every coroutine
+    runs the blocking function on a dedicated executor of the device, so one event loop can
+    drive many spectrometers without being blocked by integration times.
+    Return values are the same as for the BlockingFunctions method of the same name.
+    :param i_timeout:  Optional timeout in seconds, asyncio.TimeoutError is raised when
+    exceeded.
+    """
+    @staticmethod
+    async def lc_autodark(i_index, i_integration, i_timeout=None):
+        return await _run(i_index, i_timeout, BlockingFunctions.lc_autodark, i_integration)
+
+    @staticmethod
+    async def lc_oncedark(i_index, i_integration, i_averaging, i_timeout=None):
+        return await _run(i_index, i_timeout, BlockingFunctions.lc_oncedark, i_integration, i_averaging)
+
+    @staticmethod
+    async def lc_autointegration(i_index, i_saturation, i_integration, i_averaging, i_timeout=None):
+        return await _run(i_index, i_timeout, BlockingFunctions.lc_autointegration,
+                          i_saturation, i_integration, i_averaging)
+
+    @staticmethod
+    async def lc_getspectrum(i_index, i_darkmode, i_integration, i_averaging, i_spectrum, i_timeout=None):
+        return await _run(i_index, i_timeout, BlockingFunctions.lc_getspectrum,
+                          i_darkmode, i_integration, i_averaging, i_spectrum)
+
+    @staticmethod
+    async def lc_getspectrum_np(i_index, i_darkmode, i_integration, i_averaging, i_out=None, i_timeout=None):
+        return await _run(i_index, i_timeout, BlockingFunctions.lc_getspectrum_np,
+                          i_darkmode, i_integration, i_averaging, i_out)
+
+    @staticmethod
+    async def lc_measure(i_index, i_integration, i_averaging, i_darkmode, i_aux, i_smooth, i_timeout=None):
+        return await _run(i_index, i_timeout, BlockingFunctions.lc_measure,
+                          i_integration, i_averaging, i_darkmode, i_aux, i_smooth)
+
+    @staticmethod
+    async def lc_measuredate(i_index, i_mpitestdataitem, i_data, i_datearray, i_timeout=None):
+        return await _run(i_index, i_timeout, BlockingFunctions.lc_measuredate,
+                          i_mpitestdataitem, i_data, i_datearray)
+
+    @staticmethod
+    async def lc_measuredateall(i_index, i_items=None, i_timeout=None):
+        return await _run(i_index, i_timeout, BlockingFunctions.lc_measuredateall, i_items)
+
+    @staticmethod
+    def shutdown():
+        """
+        Stop the device executors, waiting for running calls to finish.
+        """
+        with _EXECUTORS_LOCK:
+            executors = list(_EXECUTORS.values())
+            _EXECUTORS.clear()
+        for executor in executors:
+            executor.shutdown()
+
+
+class Spectrometer:
+    """
+    Handle of one spectrometer index. All BlockingFunctions taking the device index are
+    available as methods without it (spectrometer.lc_measure(100, 5, 1, False, 0)) and are
+    serialized by a per-device lock, so several threads can share one handle safely. The lock
+    belongs to the index, all handles of one index (and AsyncFunctions) share it.
+    """
+    def __init__(self, i_index, i_serialnumber=''):
+        """
+        :param i_index:  Integer, the spectrometer's index
+        :param i_serialnumber:  String, serial number as returned by lc_getlist
+        """
+        self.index = i_index
+        self.serialnumber = i_serialnumber
+        self.lock = _device_lock(i_index)
+        self.measurements = 0
+        self.busy = 0.0
+
+    @classmethod
+    def discover(cls):
+        """
+        Initialize the library and create a handle for every connected spectrometer.
+        :return:  List of Spectrometer, empty if no device is connected or lc_init fails.
+        """
+        spectrometers = []
+        for index in range(max(BlockingFunctions.lc_init(), 0)):
+            ret, serialnumber = BlockingFunctions.lc_getlist(index, '')
+            if ret == 0:
+                spectrometers.append(cls(index, serialnumber))
+        return spectrometers
+
+    def __getattr__(self, i_name):
+        if not (i_name.startswith('lc_') or i_name == 'checkcaserror') or i_name in ('lc_init', 'lc_doneall'):
+            raise AttributeError(i_name)
+        function = getattr(BlockingFunctions, i_name)
+
+        def call(*args, **kwargs):
+            with self.lock:
+                return function(self.index, *args, **kwargs)
+        call.__name__ = i_name
+        call.__doc__ = function.__doc__
+        return call
+
+    def measure(self, i_integration, i_averaging, i_darkmode, i_aux, i_smooth, i_items=None):
+        """
+        lc_measure followed by lc_measuredateall under one lock acquisition.
+        :param i_items:  Iterable of item codes, see lc_measuredateall.
+        :return:  Tuple (return code, MeasureResult or dictionary)
+        """
+        with self.lock:
+            start = time.perf_counter()
+            try:
+                ret = BlockingFunctions.lc_measure(self.index, i_integration, i_averaging, i_darkmode, i_aux, i_smooth)
+                if ret != 0:
+                    return ret, None
+                return BlockingFunctions.lc_measuredateall(self.index, i_items)
+            finally:
+                self.busy += time.perf_counter() - start
+                self.measurements += 1
+
+    def __repr__(self):
+        return 'Spectrometer(%d, %r)' % (self.index, self.serialnumber)
+
+
+class SpectrometerPool:
+    """
+    Runs measurements on several spectrometers at once, one worker thread per device, so the
+    cycle time is set by the slowest device instead of the sum of all of them.
+    """
+    def __init__(self, i_spectrometers):
+        """
+        :param i_spectrometers:  Iterable of Spectrometer handles.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.spectrometers = list(i_spectrometers)
+        self.executor = ThreadPoolExecutor(max_workers=max(len(self.spectrometers), 1),
+                                           thread_name_prefix='LcSpvis')
+        self.cycles = 0
+        self.elapsed = 0.0
+
+    def map(self, i_function, *args, **kwargs):
+        """
+        Call i_function(spectrometer, *args, **kwargs) for all devices in parallel.
+        :return:  Dictionary device index -> return value of i_function.
+        """
+        futures = {spectrometer.index: self.executor.submit(i_function, spectrometer, *args, **kwargs)
+                   for spectrometer in self.spectrometers}
+        return {index: future.result() for index, future in futures.items()}
+
+    def measure(self, i_integration, i_averaging, i_darkmode, i_aux, i_smooth, i_items=None):
+        """
+        Spectrometer.measure on all devices in parallel.
+        :return:  Dictionary device index -> (return code, MeasureResult or dictionary)
+        """
+        start = time.perf_counter()
+        try:
+            return self.map(Spectrometer.measure, i_integration, i_averaging, i_darkmode, i_aux, i_smooth, i_items)
+        finally:
+            self.elapsed += time.perf_counter() - start
+            self.cycles += 1
+
+    def throughput(self):
+        """
+        :return:  Dictionary with measurements per second of every device (key: index, while
+        the device was busy) and of the whole pool ('aggregate', over pool wall time).
+        """
+        report = {spectrometer.index: spectrometer.measurements / spectrometer.busy if spectrometer.busy else 0.0
+                  for spectrometer in self.spectrometers}
+        total = sum(spectrometer.measurements for spectrometer in self.spectrometers)
+        report['aggregate'] = total / self.elapsed if self.elapsed else 0.0
+        return report
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
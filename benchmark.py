@@ -0,0 +1,557 @@
+import asyncio
+import csv
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import Py_LcSpvis
+import lc_averaging
+import lc_calibration
+import lc_colorimetry
+import lc_dark
+import lc_exposure
+import lc_metrics
+import lc_pipeline
+import lc_processing
+import lc_recorder
+import lc_sequence
+import lc_server
+import lc_simulator
+import lc_stream
+
+
+PIXELS = 2048
+INTERFACE_LATENCY = 50e-6
+BULK_ITEMS = [*range(0, 22), *range(31, 47), *range(901, 906)]
+
+
+def _simulator(**kwargs):
+    """
+    Route Py_LcSpvis to an initialized simulator with interop latency.
+    """
+    simulator = Py_LcSpvis.use_backend(lc_simulator.Simulator(i_latency=INTERFACE_LATENCY, **kwargs))
+    Py_LcSpvis.BlockingFunctions.lc_init()
+    return simulator
+
+
+def _timeit(i_function, i_repeat):
+    start = time.perf_counter()
+    for _ in range(i_repeat):
+        i_function()
+    return (time.perf_counter() - start) / i_repeat
+
+
+def bench_measuredate(i_repeat=200):
+    """
+    Per-item lc_measuredate loop against one lc_measuredateall call.
+    """
+    _simulator()
+    Py_LcSpvis.BlockingFunctions.lc_measure(0, 10, 1, 1, False, 0)
+
+    def per_item():
+        return {item: Py_LcSpvis.BlockingFunctions.lc_measuredate(0, item, 0, [])[1] for item in BULK_ITEMS}
+
+    def bulk():
+        return Py_LcSpvis.BlockingFunctions.lc_measuredateall(0, BULK_ITEMS)[1]
+
+    assert np.array_equal(list(per_item().values()), list(bulk().values()), equal_nan=True)
+    loop = _timeit(per_item, i_repeat)
+    single = _timeit(bulk, i_repeat)
+    print('Measure date, %d items' % len(BULK_ITEMS))
+    print('  per item loop: %8.1f us' % (loop * 1e6))
+    print('  bulk call:     %8.1f us' % (single * 1e6))
+    print('  speedup:       %8.1f x' % (loop / single))
+
+
+def bench_spectrum(i_repeat=500, i_pixels=PIXELS):
+    """
+    Element by element spectrum conversion against the NumPy bulk copy.
+    """
+    _simulator(i_pixels=i_pixels, i_noise=0.0)
+
+    def per_element():
+        spectrum = Py_LcSpvis.BlockingFunctions.lc_getspectrum(0, 0, 0, 1, [])[1]
+        data = []
+        for value in spectrum:
+            data.append(value)
+        return data
+
+    def bulk():
+        return Py_LcSpvis.BlockingFunctions.lc_getspectrum_np(0, 0, 0, 1)[1]
+
+    assert per_element() == bulk().tolist()
+    loop = _timeit(per_element, i_repeat)
+    single = _timeit(bulk, i_repeat)
+    print('Spectrum transfer, %d pixels, %d bytes copied per frame' % (i_pixels, bulk().nbytes))
+    print('  per element:   %8.0f frames/s' % (1 / loop))
+    print('  numpy bulk:    %8.0f frames/s' % (1 / single))
+
+
+def bench_pool(i_devices=4, i_cycles=10, i_integration=20, i_averaging=1):
+    """
+    Measuring all devices one after another against the SpectrometerPool.
+    """
+    _simulator(i_devices=i_devices)
+    spectrometers = Py_LcSpvis.Spectrometer.discover()
+
+    start = time.perf_counter()
+    for _ in range(i_cycles):
+        for spectrometer in spectrometers:
+            spectrometer.measure(i_integration, i_averaging, 1, False, 0, BULK_ITEMS)
+    serial = (time.perf_counter() - start) / i_cycles
+
+    spectrometers = Py_LcSpvis.Spectrometer.discover()
+    with Py_LcSpvis.SpectrometerPool(spectrometers) as pool:
+        start = time.perf_counter()
+        for _ in range(i_cycles):
+            pool.measure(i_integration, i_averaging, 1, False, 0, BULK_ITEMS)
+        parallel = (time.perf_counter() - start) / i_cycles
+        throughput = pool.throughput()
+    print('Pool, %d devices, %d ms integration' % (i_devices, i_integration * i_averaging))
+    print('  serial cycle:  %8.1f ms' % (serial * 1e3))
+    print('  pool cycle:    %8.1f ms' % (parallel * 1e3))
+    for index in range(i_devices):
+        print('  device %d:      %8.1f measurements/s' % (index, throughput[index]))
+    print('  aggregate:     %8.1f measurements/s' % throughput['aggregate'])
+
+
+def bench_async(i_devices=4, i_cycles=10, i_integration=20):
+    """
+    One event loop driving several stations through AsyncFunctions.
+    """
+    _simulator(i_devices=i_devices)
+    functions = Py_LcSpvis.AsyncFunctions
+
+    async def station(i_index):
+        for _ in range(i_cycles):
+            await functions.lc_measure(i_index, i_integration, 1, 1, False, 0, i_timeout=1)
+            await functions.lc_measuredateall(i_index, BULK_ITEMS)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(station(index) for index in range(i_devices)))
+        return (time.perf_counter() - start) / i_cycles
+
+    cycle = asyncio.run(main())
+    functions.shutdown()
+    print('Async, %d stations, %d ms integration' % (i_devices, i_integration))
+    print('  cycle:         %8.1f ms' % (cycle * 1e3))
+
+
+def bench_stream(i_frames=200, i_capacity=16, i_integration=1, i_consumer=2e-3):
+    """
+    Streaming into the ring buffer with a consumer slower than the acquisition.
+    """
+    _simulator()
+    print('Stream, %d ms integration, %.0f ms consumer, %d frames ring' % (i_integration, i_consumer * 1e3, i_capacity))
+    for policy in (lc_stream.BLOCK, lc_stream.DROP_OLDEST, lc_stream.DROP_NEWEST):
+        stream = lc_stream.SpectrumStream(0, 0, i_integration, 1, i_capacity, policy)
+        start = time.perf_counter()
+        with stream:
+            for count, (spectrum, frame) in enumerate(stream, 1):
+                time.sleep(i_consumer)
+                if count == i_frames:
+                    break
+        elapsed = time.perf_counter() - start
+        statistics = stream.statistics()
+        print('  %-12s %6.0f frames/s consumed, %4d produced, %4d dropped' %
+              (policy, i_frames / elapsed, statistics['produced'], statistics['dropped']))
+
+
+def bench_dark(i_cycles=50, i_integration=10, i_averaging=1, i_maxuses=10):
+    """
+    Dark capture before every measurement against the DarkCache.
+    """
+    _simulator()
+    start = time.perf_counter()
+    for _ in range(i_cycles):
+        Py_LcSpvis.BlockingFunctions.lc_oncedark(0, i_integration, i_averaging)
+        Py_LcSpvis.BlockingFunctions.lc_measure(0, i_integration, i_averaging, 2, False, 0)
+    always = (time.perf_counter() - start) / i_cycles
+
+    cache = lc_dark.DarkCache(i_maxuses=i_maxuses)
+    start = time.perf_counter()
+    for _ in range(i_cycles):
+        cache.measure(0, i_integration, i_averaging, False, 0)
+    cached = (time.perf_counter() - start) / i_cycles
+    statistics = cache.statistics()
+    print('Dark cache, %d ms integration, refresh every %d uses' % (i_integration, i_maxuses))
+    print('  always dark:   %8.1f ms/cycle' % (always * 1e3))
+    print('  cached dark:   %8.1f ms/cycle' % (cached * 1e3))
+    print('  hits %d, misses %d, refreshes %d' % (statistics['hits'], statistics['misses'], statistics['refreshes']))
+
+
+def bench_exposure(i_duts=20, i_target=0.8):
+    """
+    Vendor auto integration against AutoExposure with warm start, on DUTs of one product.
+    """
+    simulated = _simulator()
+    rng = random.Random(1)
+    brightness = [0.04 * rng.uniform(0.97, 1.03) for _ in range(i_duts)]
+
+    start = time.perf_counter()
+    for value in brightness:
+        simulated.brightness = value
+        Py_LcSpvis.BlockingFunctions.lc_autointegration(0, i_target, 0.0, 0)
+    vendor = (time.perf_counter() - start) / i_duts
+
+    exposure = lc_exposure.AutoExposure(i_target)
+    for value in brightness:
+        simulated.brightness = value
+        ret, integration, averaging = exposure.autointegration(0, 'product')
+        assert ret == 0
+    statistics = exposure.statistics()
+    print('Auto exposure, %d DUTs' % i_duts)
+    print('  vendor routine:%8.1f ms/DUT' % (vendor * 1e3))
+    print('  auto exposure: %8.1f ms/DUT, %.2f probes/DUT' %
+          (statistics['mean_elapsed'] * 1e3, statistics['mean_probes']))
+
+
+# Published values (CIE 015:2018 and CIE 13.3) of the reference spectra shipped in
+# data/cie_illuminants.csv, item code -> value per column (A, D65, F2, F7, F11). NaN where
+# no value is published.
+CIE_REFERENCE = {
+    5: (0.44757, 0.31272, 0.3721, 0.3129, 0.3805),
+    6: (0.40745, 0.32903, 0.3751, 0.3292, 0.3769),
+    11: (2856, 6504, 4230, 6500, 4000),
+    31: (np.nan, np.nan, 64, 90, 83),
+}
+
+
+def bench_colorimetry(i_spectra=10000, i_pixels=PIXELS):
+    """
+    Batch colorimetry throughput, and accuracy against the published chromaticity, CCT and
+    Ra of the CIE reference illuminants.
+    """
+    wavelength = np.linspace(340, 1000, i_pixels)
+    engine = lc_colorimetry.get_engine(wavelength)
+    # On the 5 nm grid of the tables the published values are computed on, interpolating the
+    # line spectra of the F illuminants onto a finer grid changes their chromaticity.
+    reference_wavelength, illuminants = lc_colorimetry.default_table('illuminants')
+    computed = lc_colorimetry.get_engine(reference_wavelength).compute(illuminants.T, CIE_REFERENCE)
+    errors = lc_colorimetry.compare(computed, CIE_REFERENCE)
+    rng = np.random.default_rng(0)
+    spectra = (lc_colorimetry.planck(wavelength, rng.uniform(2000, 10000, i_spectra)) *
+               rng.uniform(0.5, 2.0, (i_spectra, 1)) / 1e13)
+    start = time.perf_counter()
+    engine.compute(spectra)
+    elapsed = time.perf_counter() - start
+    print('Colorimetry, %d x %d batch' % (i_spectra, i_pixels))
+    print('  throughput:             %8.0f spectra/s' % (i_spectra / elapsed))
+    print('  CIE A, D65, F2, F7, F11: xy error %.1e, CCT error %.1f K, Ra error %.2f'
+          % (max(errors[5][0], errors[6][0]), errors[11][0], errors[31][0]))
+
+
+def bench_recorder(i_records=1000, i_pixels=PIXELS):
+    """
+    Recorder store against CSV, write and read throughput.
+    """
+    rng = np.random.default_rng(0)
+    spectra = rng.random((i_records, 2, i_pixels))
+    values = {item: 1.0 for item in lc_recorder.DEFAULT_ITEMS}
+    megabytes = spectra.nbytes / 1e6
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        with lc_recorder.Recorder(os.path.join(directory, 'store'), i_channels=('spectrum', 'raw')) as recorder:
+            for index in range(i_records):
+                recorder.append('SIM%04d' % (index % 4), spectra[index], values, i_timestamp=index)
+        write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(os.path.join(directory, 'store.csv'), 'w', newline='') as file:
+            writer = csv.writer(file)
+            for index in range(i_records):
+                writer.writerow([index, 'SIM%04d' % (index % 4), *values.values(), *spectra[index].ravel()])
+        csv_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reader = lc_recorder.Reader(os.path.join(directory, 'store'))
+        total = reader.channel('spectrum')[reader.time_range(i_records // 4, i_records // 2)].sum()
+        for index in rng.integers(0, i_records, 1000):
+            total += reader.spectra[index, 0, 0]
+        read = time.perf_counter() - start
+        assert np.array_equal(reader.spectra[123], spectra[123])
+
+        start = time.perf_counter()
+        with open(os.path.join(directory, 'store.csv'), newline='') as file:
+            rows = [[float(value) for value in row[2:]] for row in csv.reader(file)]
+        csv_read = time.perf_counter() - start
+        assert len(rows) == i_records
+    print('Recorder, %d records, %.1f MB of spectra' % (i_records, megabytes))
+    print('  store write:   %8.1f MB/s, CSV %.1f MB/s' % (megabytes / write, megabytes / csv_write))
+    print('  store open + range + 1000 random reads: %.1f ms, CSV full read %.1f ms' % (read * 1e3, csv_read * 1e3))
+
+
+def bench_backend():
+    """
+    Cold import time of Py_LcSpvis and latency of the first call for both backends.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    script = ('import time\n'
+              'start = time.perf_counter()\n'
+              'import Py_LcSpvis\n'
+              'imported = time.perf_counter()\n'
+              '%s\n'
+              'ready = time.perf_counter()\n'
+              'Py_LcSpvis.BlockingFunctions.lc_init()\n'
+              'print(imported - start, time.perf_counter() - ready)\n')
+    backends = {'simulator': 'import lc_simulator; Py_LcSpvis.use_backend(lc_simulator.Simulator())',
+                'clr': 'Py_LcSpvis.BlockingFunctions.__init__(Py_LcSpvis, %r)' % os.path.join(directory, 'library')}
+    print('Backends')
+    for name, setup in backends.items():
+        process = subprocess.run([sys.executable, '-c', script % setup], cwd=directory, capture_output=True,
+                                 text=True)
+        if process.returncode != 0:
+            print('  %-10s unavailable (%s)' % (name, process.stderr.strip().splitlines()[-1]))
+            continue
+        imported, first = (float(value) for value in process.stdout.split())
+        print('  %-10s import %6.1f ms, first call %8.1f ms' % (name, imported * 1e3, first * 1e3))
+
+
+def bench_metrics(i_repeat=2000):
+    """
+    Call cost with instrumentation disabled and enabled.
+    """
+    _simulator()
+
+    def call():
+        return Py_LcSpvis.BlockingFunctions.lc_setintegration(0, 10, 1)
+
+    disabled = _timeit(call, i_repeat)
+    lc_metrics.enable()
+    enabled = _timeit(call, i_repeat)
+    lc_metrics.disable()
+    print('Metrics, lc_setintegration with %.0f us interop latency' % (INTERFACE_LATENCY * 1e6))
+    print('  disabled:      %8.1f us' % (disabled * 1e6))
+    print('  enabled:       %8.1f us' % (enabled * 1e6))
+
+
+def bench_pipeline(i_frames=50, i_integration=10, i_processing=8e-3):
+    """
+    Sequential measure, extract and process cycles against the double-buffered pipeline.
+    """
+    _simulator()
+
+    def process(i_result, i_spectrum):
+        time.sleep(i_processing)
+        return float(i_spectrum.max())
+
+    start = time.perf_counter()
+    for _ in range(i_frames):
+        Py_LcSpvis.BlockingFunctions.lc_measure(0, i_integration, 1, 1, False, 0)
+        _, result = Py_LcSpvis.BlockingFunctions.lc_measuredateall(0)
+        process(result, np.asarray(result.spectrum))
+    sequential = i_frames / (time.perf_counter() - start)
+    pipeline = lc_pipeline.Pipeline(0, i_integration, 1, 1, process)
+    pipeline.run(i_frames)
+    statistics = pipeline.statistics()
+    print('Pipeline, %d ms integration, %.0f ms processing, %d frames' %
+          (i_integration, i_processing * 1e3, i_frames))
+    print('  sequential:    %8.1f frames/s' % sequential)
+    print('  pipelined:     %8.1f frames/s (ideal %.1f)' % (statistics['rate'], statistics['ideal_rate']))
+    print('  stages:        measure %.0f ms, extract %.0f ms, process %.0f ms, wall %.0f ms' %
+          tuple(statistics[stage] * 1e3 for stage in ('measure', 'extract', 'process', 'wall')))
+    print('  overlap:       %8.2f' % statistics['overlap'])
+
+
+def bench_server(i_repeat=500, i_pixels=PIXELS):
+    """
+    Round trip of calls through the acquisition server against in-process calls, both on a
+    simulator with the same interop latency.
+    """
+    _simulator(i_pixels=i_pixels)
+    functions = Py_LcSpvis.BlockingFunctions
+    calls = {'lc_setintegration': (0, 10, 1), 'lc_getspectrum_np': (0, 1, 0.0, 1),
+             'lc_measuredateall': (0,)}
+    functions.lc_measure(0, 10, 1, 1, False, 0)
+    local = {name: _timeit(lambda: getattr(functions, name)(*args), i_repeat) for name, args in calls.items()}
+    expected = functions.lc_measuredateall(0)[1]
+
+    path = os.path.join(tempfile.mkdtemp(), 'lcspvis.sock')
+    server = subprocess.Popen([sys.executable, lc_server.__file__, '--socket', path, '--backend', 'simulator',
+                               '--latency', str(INTERFACE_LATENCY * 1e6)], stdout=subprocess.PIPE, text=True)
+    try:
+        server.stdout.readline()
+        with lc_server.Client(path) as client:
+            client.lc_measure(0, 10, 1, 1, False, 0)
+            result = client.lc_measuredateall(0)[1]
+            assert result.wavelength.shape == expected.wavelength.shape and result.cct > 0
+            for name, args in calls.items():
+                _timeit(lambda: getattr(client, name)(*args), i_repeat // 10)
+            remote = {name: _timeit(lambda: getattr(client, name)(*args), i_repeat) for name, args in calls.items()}
+    finally:
+        server.terminate()
+        server.wait()
+    print('Server, %d pixels, %.0f us interop latency' % (i_pixels, INTERFACE_LATENCY * 1e6))
+    for name in calls:
+        print('  %-20s in-process %8.1f us, server %8.1f us' % (name, local[name] * 1e6, remote[name] * 1e6))
+
+
+def bench_processing(i_spectra=10000, i_pixels=PIXELS):
+    """
+    Post-processing throughput on a batch of spectra measured on a non-uniform device grid.
+    """
+    _simulator(i_pixels=i_pixels)
+    pixels = np.arange(i_pixels)
+    wavelength = 340 + 0.33 * pixels - 1e-5 * pixels ** 2
+    resampler = lc_processing.device_resampler(0, 1.0, wavelength)
+    rng = np.random.default_rng(0)
+    spectra = (lc_colorimetry.planck(wavelength, rng.uniform(2000, 10000, i_spectra)) / 1e13 +
+               rng.normal(0, 1e-3, (i_spectra, i_pixels)))
+    stages = {'resample 1 nm': lambda: resampler(spectra),
+              'rolling 9': lambda: lc_processing.rolling(spectra, 9),
+              'savgol 11/2': lambda: lc_processing.savgol(spectra, 11, 2),
+              'baseline 2/20': lambda: lc_processing.remove_baseline(spectra, 2, 20),
+              'peak/FWHM': lambda: lc_processing.peaks(spectra, wavelength)}
+    print('Processing, %d x %d batch' % (i_spectra, i_pixels))
+    for name, stage in stages.items():
+        elapsed = _timeit(stage, 1)
+        print('  %-14s %8.0f spectra/s' % (name + ':', i_spectra / elapsed))
+
+
+def bench_averaging(i_duts=20, i_integration=5, i_maxframes=64, i_target=0.002):
+    """
+    Fixed averaging sized for the darkest DUT against adaptive averaging, on DUTs spanning
+    a brightness range of 8.
+    """
+    simulated = _simulator(i_noise=0.01)
+    rng = random.Random(2)
+    brightness = [rng.uniform(0.005, 0.04) for _ in range(i_duts)]
+
+    start = time.perf_counter()
+    for value in brightness:
+        simulated.brightness = value
+        Py_LcSpvis.BlockingFunctions.lc_getspectrum_np(0, 1, i_integration, i_maxframes)
+    fixed = (time.perf_counter() - start) / i_duts
+
+    averaging = lc_averaging.AdaptiveAveraging(i_target, lc_averaging.BAND, i_maxframes=i_maxframes)
+    for value in brightness:
+        simulated.brightness = value
+        ret, spectrum = averaging.acquire(0, 1, i_integration)
+        assert ret == 0
+    statistics = averaging.statistics()
+    print('Adaptive averaging, %d DUTs, %d ms frames, %.1e band error target' % (i_duts, i_integration, i_target))
+    print('  fixed %3d:     %8.1f ms/DUT' % (i_maxframes, fixed * 1e3))
+    print('  adaptive:      %8.1f ms/DUT, %.1f frames/DUT, %.0f %% frames saved' %
+          (statistics['mean_elapsed'] * 1e3, statistics['mean_frames'], statistics['saved'] * 100))
+
+
+def bench_sequence(i_runs=20):
+    """
+    A test sequence with configuration calls before every step, run directly and with the
+    shadow state of SequenceRunner.
+    """
+    _simulator()
+    functions = Py_LcSpvis.BlockingFunctions
+    directory = tempfile.mkdtemp()
+    license = os.path.join(directory, 'license.spt')
+    with open(license, 'w') as file:
+        file.write('simulated')
+    functions.lc_savefbr(0, 0, directory)
+    calibration = os.path.join(directory, 'Sp_%s.txt' % functions.lc_getlist(0, '')[1])
+    sequence = """
+        device: 0
+        license: %s
+        calibration: %s
+        zoom: 1.0
+        integration: 10
+        averaging: 1
+        steps:
+          - dark
+          - measure: {darkmode: 2}
+          - extract: {items: [cx, cy, cct, flux]}
+          - measure: {darkmode: 2, averaging: 2}
+          - extract: {items: [peak_wavelength, fwhm]}
+          - limits: {cx: [0.0, 1.0], cct: [1000, null]}
+    """ % (license, calibration)
+
+    def direct():
+        for darkmode, averaging in ((None, 1), (2, 1), (2, 2)):
+            functions.lc_activate(0, license)
+            functions.lc_readfbr(0, calibration)
+            functions.lc_setzoomfactor(0, 1.0)
+            functions.lc_setintegration(0, 10, averaging)
+            if darkmode is None:
+                functions.lc_oncedark(0, 10, 1)
+            else:
+                functions.lc_measure(0, 10, averaging, darkmode, False, 0)
+                functions.lc_measuredateall(0)
+
+    elapsed = _timeit(direct, i_runs)
+    lc_sequence.invalidate()
+    runner = lc_sequence.SequenceRunner(sequence)
+    start = time.perf_counter()
+    for _ in range(i_runs):
+        report = runner.run()
+        assert report['passed']
+    shadowed = (time.perf_counter() - start) / i_runs
+    statistics = runner.statistics()
+    print('Sequence, %d runs of 6 steps' % i_runs)
+    print('  direct:        %8.2f ms/run' % (elapsed * 1e3))
+    print('  runner:        %8.2f ms/run, %.1f calls avoided/run, %.2f ms saved/run' %
+          (shadowed * 1e3, statistics['avoided'] / i_runs, statistics['saved'] / i_runs * 1e3))
+
+
+def bench_calibration(i_spectra=10000, i_integration=10.0, i_zoom=1.5):
+    """
+    Offline calibration of raw counts against the spectra calibrated by lc_measure of the
+    simulator, and batch throughput. The simulator implements the same model, the error
+    only shows that the two agree, not that the model matches the library.
+    """
+    simulated = _simulator(i_noise=0.0)
+    functions = Py_LcSpvis.BlockingFunctions
+    wavelength = simulated.wavelength
+    lamp_wavelength = np.arange(300.0, 1101.0, 5.0)
+    lamp = lc_colorimetry.planck(lamp_wavelength, 2856.0)[0] / 1e13
+    functions.lc_oncedark(0, i_integration, 1)
+    functions.lc_almp(0, 2, i_integration, 1, lamp, lamp_wavelength)
+    functions.lc_setzoomfactor(0, i_zoom)
+    directory = tempfile.mkdtemp()
+    functions.lc_savefbr(0, 0, directory)
+    serialnumber = functions.lc_getlist(0, '')[1]
+
+    raw = functions.lc_getspectrum_np(0, 0, i_integration, 1, np.empty(len(wavelength)))[1]
+    dark = raw - functions.lc_getspectrum_np(0, 2, i_integration, 1)[1]
+    derived = lc_calibration.derive(wavelength, raw - dark, i_integration, lamp, lamp_wavelength)
+    calibration = lc_calibration.Calibration.from_serialnumber(directory, serialnumber, wavelength, i_zoom)
+    functions.lc_measure(0, i_integration, 1, 2, False, 0)
+    expected = functions.lc_measuredate_np(0, 802)[1]
+    calibrated = calibration.apply(raw, i_integration, dark)[0]
+    error = lc_calibration.compare(calibrated, expected)[1]
+    factor_error = np.max(np.abs(derived - calibration.factor)) / np.max(np.abs(calibration.factor))
+
+    start = time.perf_counter()
+    for _ in range(10):
+        lc_calibration.read_table(lc_calibration.calibration_file(directory, serialnumber))
+    cached = (time.perf_counter() - start) / 10
+    batch = np.tile(raw, (i_spectra, 1))
+    elapsed = _timeit(lambda: calibration.apply(batch, i_integration, dark), 1)
+    print('Calibration, %d x %d batch' % (i_spectra, len(wavelength)))
+    print('  simulator consistency: %8.1e max relative error, derived factors %.1e' % (error, factor_error))
+    print('  cached table:           %8.1f us' % (cached * 1e6))
+    print('  throughput:             %8.0f spectra/s' % (i_spectra / elapsed))
+
+
+if __name__ == '__main__':
+    bench_measuredate()
+    bench_spectrum()
+    bench_pool()
+    bench_async()
+    bench_stream()
+    bench_dark()
+    bench_exposure()
+    bench_colorimetry()
+    bench_recorder()
+    bench_backend()
+    bench_metrics()
+    bench_pipeline()
+    bench_server()
+    bench_processing()
+    bench_averaging()
+    bench_sequence()
+    bench_calibration()
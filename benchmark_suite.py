@@ -0,0 +1,274 @@
+"""
+Benchmark suite for the Py_LcSpvis call surface.
+
+    python benchmark_suite.py [--backend simulator|clr] [--json results.json]
+                              [--thresholds benchmark_thresholds.json]
+                              [--baseline previous.json --tolerance 1.5 --floor 5]
+
+Measures the per-call cost of every BlockingFunctions method next to the direct backend
+call (the difference is the wrapper overhead), ref/out marshalling, array transfer by pixel
+count and complete dark + measure + extract cycles. Results are written as JSON, the exit
+code is 1 if a threshold or the baseline tolerance is exceeded.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import Py_LcSpvis
+import lc_simulator
+
+
+BlockingFunctions = Py_LcSpvis.BlockingFunctions
+
+CYCLE_ITEMS = {
+    'cx_cy_flux': (5, 6, 1),
+    'colorimetry': (*range(2, 13), 31),
+    'all': (*range(0, 22), *range(31, 47), *range(901, 906)),
+}
+
+
+def _measure(i_function, i_number, i_repeat=5):
+    """
+    :return:  Best mean seconds per call over i_repeat rounds of i_number calls.
+    """
+    best = float('inf')
+    for _ in range(i_repeat):
+        start = time.perf_counter()
+        for _ in range(i_number):
+            i_function()
+        best = min(best, (time.perf_counter() - start) / i_number)
+    return best
+
+
+def _compare(i_wrapper, i_direct, i_number, i_repeat=7):
+    """
+    Time wrapper and direct call in alternating rounds, so load changes hit both alike.
+    :return:  Tuple (best seconds per wrapper call, best seconds per direct call, noise),
+    the noise is the larger distance between median and best round of the two.
+    """
+    wrapper, direct = [], []
+    for _ in range(i_repeat):
+        wrapper.append(_measure(i_wrapper, i_number, 1))
+        direct.append(_measure(i_direct, i_number, 1))
+    noise = max(sorted(rounds)[len(rounds) // 2] - min(rounds) for rounds in (wrapper, direct))
+    return min(wrapper), min(direct), noise
+
+
+def _calls(i_directory, i_integration):
+    """
+    :return:  Dictionary method name -> (wrapper call, direct backend call).
+    """
+    t = i_integration
+    lamp = [1.0] * 16
+    wave = [380.0 + 25 * i for i in range(16)]
+    missing = os.path.join(i_directory, 'missing.txt')
+    calls = {
+        'lc_getlist': ((0, ''), 'LC_GetList', (0, '')),
+        'lc_activate': ((0, missing), 'LC_Activate', (0, missing)),
+        'lc_getparameters': ((0, 1, ''), 'LC_GetParameters', (0, 1, '')),
+        'lc_autodark': ((0, t), 'LC_AutoDark', (0, t)),
+        'lc_oncedark': ((0, t, 1), 'LC_OnceDark', (0, t, 1)),
+        'lc_autointegration': ((0, 0.8, 0.0, 0), 'LC_AutoIntegration', (0, 0.8, 0.0, 0)),
+        'lc_setintegration': ((0, t, 1), 'LC_SetIntegration', (0, t, 1)),
+        'lc_getsaturation': ((0, t, 1, 0.0), 'LC_GetSaturation', (0, t, 1, 0.0)),
+        'lc_setautomaxintegration': ((0, 5000.0, 100), 'LC_SetAutoMaxIntegration', (0, 5000.0, 100)),
+        'lc_getspectrum': ((0, 1, t, 1, []), 'LC_GetSpectrum', (0, 1, t, 1, [])),
+        'lc_getspectrum_np': ((0, 1, t, 1), 'LC_GetSpectrum', (0, 1, t, 1, [])),
+        'lc_almp': ((0, 1, t, 1, lamp, wave), 'LC_Almp', (0, 1, t, 1, lamp, wave)),
+        'lc_readfbr': ((0, missing), 'LC_ReadFbr', (0, missing)),
+        'lc_savefbr': ((0, 0, i_directory), 'LC_SaveFbr', (0, 0, i_directory)),
+        'lc_setzoomfactor': ((0, 1.0), 'LC_SetZoomFactor', (0, 1.0)),
+        'lc_measure': ((0, t, 1, 1, False, 0), 'LC_Measure', (0, t, 1, 1, False, 0)),
+        'lc_measuredate': ((0, 5, 0, []), 'LC_MeasureDate', (0, 5, 0, [])),
+        'lc_measuredate_np': ((0, 802), 'LC_MeasureDate', (0, 802, 0, [])),
+        'lc_measuredateall': ((0,), 'LC_MeasureDate', (0, Py_LcSpvis.LC_DATA())),
+        'checkcaserror': ((0, ''), 'CheckCASError', (0, '')),
+    }
+    return {name: ((lambda f=getattr(BlockingFunctions, name), a=args: f(*a)),
+                   (lambda f=getattr(Py_LcSpvis.LC, method), a=direct: f(*a)))
+            for name, (args, method, direct) in calls.items()}
+
+
+def bench_calls(i_number, i_integration):
+    """
+    Wrapper and direct cost of every BlockingFunctions method, in microseconds.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        results['lc_init'] = {'wrapper_us': _measure(BlockingFunctions.lc_init, i_number) * 1e6}
+        BlockingFunctions.lc_measure(0, i_integration, 1, 1, False, 0)
+        for name, (wrapper, direct) in _calls(directory, i_integration).items():
+            wrapper_time, direct_time, noise = _compare(wrapper, direct, i_number)
+            results[name] = {'wrapper_us': wrapper_time * 1e6, 'direct_us': direct_time * 1e6,
+                             'overhead_us': (wrapper_time - direct_time) * 1e6, 'noise_us': noise * 1e6}
+    return results
+
+
+def bench_marshalling(i_number, i_integration):
+    """
+    Cost of calls returning ref/out values against a call with a plain return code.
+    """
+    BlockingFunctions.lc_measure(0, i_integration, 1, 1, False, 0)
+    plain = _measure(lambda: BlockingFunctions.lc_setzoomfactor(0, 1.0), i_number)
+    calls = {
+        'lc_getlist': lambda: BlockingFunctions.lc_getlist(0, ''),
+        'lc_getsaturation': lambda: BlockingFunctions.lc_getsaturation(0, i_integration, 1, 0.0),
+        'lc_measuredate_scalar': lambda: BlockingFunctions.lc_measuredate(0, 5, 0, []),
+        'lc_measuredate_array': lambda: BlockingFunctions.lc_measuredate(0, 802, 0, []),
+        'lc_measuredateall': lambda: BlockingFunctions.lc_measuredateall(0),
+    }
+    results = {'plain_us': plain * 1e6}
+    for name, call in calls.items():
+        elapsed = _measure(call, i_number)
+        results[name] = {'call_us': elapsed * 1e6, 'marshalling_us': (elapsed - plain) * 1e6}
+    return results
+
+
+def bench_arrays(i_number, i_pixels, i_latency):
+    """
+    Spectrum transfer per pixel count, element by element against the NumPy bulk copy.
+    """
+    results = {}
+    for pixels in i_pixels:
+        Py_LcSpvis.use_backend(lc_simulator.Simulator(i_pixels=pixels, i_latency=i_latency, i_timescale=0.0))
+        BlockingFunctions.lc_init()
+        elements = _measure(lambda: list(BlockingFunctions.lc_getspectrum(0, 0, 1.0, 1, [])[1]), i_number)
+        bulk = _measure(lambda: BlockingFunctions.lc_getspectrum_np(0, 0, 1.0, 1), i_number)
+        results[str(pixels)] = {'bytes': pixels * 8, 'elements_us': elements * 1e6, 'numpy_us': bulk * 1e6}
+    return results
+
+
+def bench_cycles(i_number, i_integration):
+    """
+    Complete dark + measure + extract cycles, per item extraction against the bulk call.
+    """
+    def cycle(i_items, i_bulk):
+        BlockingFunctions.lc_oncedark(0, i_integration, 1)
+        BlockingFunctions.lc_measure(0, i_integration, 1, 2, False, 0)
+        if i_bulk:
+            return BlockingFunctions.lc_measuredateall(0, i_items)
+        return [BlockingFunctions.lc_measuredate(0, item, 0, []) for item in i_items]
+
+    results = {}
+    for name, items in CYCLE_ITEMS.items():
+        results[name] = {'items': len(items),
+                         'per_item_ms': _measure(lambda: cycle(items, False), i_number, 3) * 1e3,
+                         'bulk_ms': _measure(lambda: cycle(items, True), i_number, 3) * 1e3}
+    return results
+
+
+def run_suite(i_backend='simulator', i_path=None, i_latency=50e-6, i_integration=10.0, i_number=200,
+              i_pixels=(512, 1024, 2048, 4096)):
+    """
+    :param i_backend:  'simulator' or 'clr' (the .net library in i_path with a device at index 0).
+    :param i_latency:  Double, simulated interop seconds per call.
+    :param i_integration:  Double, integration time of the measuring calls in ms.
+    :param i_number:  Integer, calls per timing round.
+    :param i_pixels:  Pixel counts for the array transfer benchmark (simulator only).
+    :return:  Dictionary of results, see the module docstring.
+    """
+    def install(i_timescale):
+        if i_backend == 'clr':
+            BlockingFunctions.__init__(Py_LcSpvis, i_path)
+        else:
+            Py_LcSpvis.use_backend(lc_simulator.Simulator(i_latency=i_latency, i_timescale=i_timescale))
+        BlockingFunctions.lc_init()
+
+    results = {'meta': {'backend': i_backend, 'latency_us': i_latency * 1e6, 'integration_ms': i_integration,
+                        'python': platform.python_version(), 'machine': platform.machine(), 'time': time.time()}}
+    # Integration does not sleep for the call and marshalling costs, only the interop latency counts.
+    install(0.0)
+    results['calls'] = bench_calls(i_number, i_integration)
+    results['marshalling'] = bench_marshalling(i_number, i_integration)
+    if i_backend == 'simulator':
+        results['arrays'] = bench_arrays(i_number, i_pixels, i_latency)
+    install(1.0)
+    results['cycles'] = bench_cycles(max(i_number // 20, 3), i_integration)
+    return results
+
+
+def _flatten(i_results, i_prefix=''):
+    flat = {}
+    for key, value in i_results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, i_prefix + key + '.'))
+        elif isinstance(value, (int, float)):
+            flat[i_prefix + key] = value
+    return flat
+
+
+def check(i_results, i_thresholds=None, i_baseline=None, i_tolerance=1.5, i_floor=5.0):
+    """
+    :param i_thresholds:  Dictionary metric pattern (dotted path, fnmatch wildcards) ->
+    largest allowed value.
+    :param i_baseline:  Earlier results, every *_us and *_ms metric may grow by i_tolerance
+    plus an absolute noise floor. Overheads and marshalling costs are differences of two
+    timings and may be close to 0 or negative, for them the floor matters most.
+    :param i_floor:  Double, noise floor in microseconds. For call overheads it is raised to
+    three times the noise measured for the call in this run.
+    :return:  List of failure messages, empty if everything is within limits.
+    """
+    flat = _flatten(i_results)
+    failures = []
+    for pattern, limit in (i_thresholds or {}).items():
+        for metric in fnmatch.filter(flat, pattern):
+            if flat[metric] > limit:
+                failures.append('%s = %.2f exceeds threshold %.2f' % (metric, flat[metric], limit))
+    if i_baseline is not None:
+        for metric, previous in _flatten(i_baseline).items():
+            if metric.startswith('meta.') or not metric.endswith(('_us', '_ms')) or metric not in flat:
+                continue
+            if metric.endswith('.noise_us'):
+                continue
+            floor = i_floor if metric.endswith('_us') else i_floor / 1000
+            if metric.endswith('.overhead_us'):
+                floor = max(floor, 3 * flat.get(metric[:-len('overhead_us')] + 'noise_us', 0.0))
+            limit = max(previous, 0.0) * i_tolerance + floor
+            if flat[metric] > limit:
+                failures.append('%s = %.2f exceeds %.2f (baseline %.2f)' % (metric, flat[metric], limit, previous))
+    return failures
+
+
+def main(i_arguments=None):
+    parser = argparse.ArgumentParser(description='Py_LcSpvis benchmark suite')
+    parser.add_argument('--backend', choices=('simulator', 'clr'), default='simulator')
+    parser.add_argument('--path', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'library'))
+    parser.add_argument('--latency', type=float, default=50.0, help='simulated interop latency in us')
+    parser.add_argument('--integration', type=float, default=10.0, help='integration time in ms')
+    parser.add_argument('--number', type=int, default=200, help='calls per timing round')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--thresholds', help='JSON file with metric thresholds')
+    parser.add_argument('--baseline', help='JSON results of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed slowdown against the baseline')
+    parser.add_argument('--floor', type=float, default=5.0, help='noise floor of the baseline check in us')
+    arguments = parser.parse_args(i_arguments)
+
+    results = run_suite(arguments.backend, arguments.path, arguments.latency * 1e-6, arguments.integration,
+                        arguments.number)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if arguments.json:
+        with open(arguments.json, 'w') as file:
+            file.write(text)
+    else:
+        print(text)
+
+    thresholds = baseline = None
+    if arguments.thresholds:
+        with open(arguments.thresholds) as file:
+            thresholds = json.load(file)
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+    failures = check(results, thresholds, baseline, arguments.tolerance, arguments.floor)
+    for failure in failures:
+        print('REGRESSION: ' + failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
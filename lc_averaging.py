@@ -0,0 +1,133 @@
+import threading
+import time
+
+import numpy as np
+
+from Py_LcSpvis import BlockingFunctions, DeviceLocks
+
+
+PIXEL = 'pixel'
+BAND = 'band'
+
+
+class Welford:
+    """
+    Streaming mean and variance of spectra, updated per frame for all pixels at once.
+    """
+    def __init__(self, i_pixels):
+        self.count = 0
+        self.mean = np.zeros(i_pixels)
+        self.m2 = np.zeros(i_pixels)
+        self.delta = np.empty(i_pixels)
+
+    def add(self, i_frame):
+        self.count += 1
+        np.subtract(i_frame, self.mean, out=self.delta)
+        self.mean += self.delta / self.count
+        self.m2 += self.delta * (i_frame - self.mean)
+
+    def variance(self):
+        """
+        :return:  Sample variance per pixel, NaN below 2 frames.
+        """
+        if self.count < 2:
+            return np.full_like(self.mean, np.nan)
+        return self.m2 / (self.count - 1)
+
+
+class AdaptiveAveraging(DeviceLocks):
+    """
+    Averaging with early stopping, replacement for a fixed i_averaging sized for the
+    darkest DUT. Single frames are taken with lc_getspectrum and averaged until the relative
+    standard error of the mean reaches the target, so bright DUTs stop after a few frames.
+    The error is taken either per pixel (PIXEL, the worst pixel of the band above i_floor x
+    the band maximum) or of the band integral (BAND, pixel noise regarded as independent).
+    """
+    def __init__(self, i_target=0.01, i_mode=BAND, i_band=None, i_minframes=2, i_maxframes=100, i_floor=0.1):
+        """
+        :param i_target:  Double, relative standard error of the mean to reach.
+        :param i_mode:  PIXEL or BAND.
+        :param i_band:  Tuple (first pixel, last pixel + 1) the error is evaluated on, the
+        whole spectrum if None.
+        :param i_minframes:  Integer, frames taken before the first check, at least 2.
+        :param i_maxframes:  Integer, frames taken at most.
+        :param i_floor:  Double, PIXEL mode ignores pixels below this fraction of the band
+        maximum, their relative error is dominated by the dark noise.
+        """
+        if i_mode not in (PIXEL, BAND):
+            raise ValueError('Unknown mode %r' % (i_mode,))
+        self.target = i_target
+        self.mode = i_mode
+        self.band = slice(None) if i_band is None else slice(*i_band)
+        self.minframes = max(i_minframes, 2)
+        self.maxframes = i_maxframes
+        self.floor = i_floor
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.error = np.nan
+        self.elapsed = 0.0
+        self.acquisitions = 0
+        self.total_frames = 0
+        self.total_elapsed = 0.0
+
+    def relative_error(self, i_accumulator):
+        """
+        :return:  Relative standard error of the mean of the accumulated frames.
+        """
+        mean = i_accumulator.mean[self.band]
+        variance = i_accumulator.variance()[self.band]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.mode == BAND:
+                return np.sqrt(variance.sum() / i_accumulator.count) / abs(mean.sum())
+            used = mean >= self.floor * mean.max()
+            if not used.any():
+                return np.inf
+            return np.max(np.sqrt(variance[used] / i_accumulator.count) / mean[used])
+
+    def acquire(self, i_index, i_darkmode, i_integration):
+        """
+        :param i_index:  Integer, the selected spectrometer's index
+        :param i_darkmode:  Integer, dark mode (see lc_getspectrum)
+        :param i_integration:  Double, integration time of each frame
+        :return:  Tuple (return code, mean spectrum ndarray or None). The number of frames,
+        the reached relative error and the seconds spent are stored in frames, error and
+        elapsed, they describe the last acquisition of any device.
+        """
+        with self.device_lock(i_index):
+            start = time.perf_counter()
+            accumulator = None
+            error = np.nan
+            try:
+                while accumulator is None or accumulator.count < self.maxframes:
+                    ret, frame = BlockingFunctions.lc_getspectrum_np(i_index, i_darkmode, i_integration, 1)
+                    if ret != 0:
+                        return ret, None
+                    if accumulator is None:
+                        accumulator = Welford(len(frame))
+                    accumulator.add(frame)
+                    if accumulator.count >= self.minframes:
+                        error = self.relative_error(accumulator)
+                        if error <= self.target:
+                            break
+                return ret, accumulator.mean
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.frames = 0 if accumulator is None else accumulator.count
+                    self.error = error
+                    self.elapsed = elapsed
+                    self.acquisitions += 1
+                    self.total_frames += self.frames
+                    self.total_elapsed += elapsed
+
+    def statistics(self):
+        """
+        :return:  Dictionary with the number of acquisitions, total and mean frames and
+        seconds, and the share of frames saved against always taking i_maxframes.
+        """
+        with self.lock:
+            acquisitions = max(self.acquisitions, 1)
+            return {'acquisitions': self.acquisitions, 'frames': self.total_frames, 'elapsed': self.total_elapsed,
+                    'mean_frames': self.total_frames / acquisitions,
+                    'mean_elapsed': self.total_elapsed / acquisitions,
+                    'saved': 1 - self.total_frames / (acquisitions * self.maxframes)}
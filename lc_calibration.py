@@ -0,0 +1,167 @@
+import os
+import threading
+
+import numpy as np
+
+
+# Calibration tables already parsed, serial number -> (path, modification time,
+# wavelength, factor).
+_TABLES = {}
+_TABLES_LOCK = threading.Lock()
+
+
+def calibration_file(i_directory, i_serialnumber):
+    """
+    :return:  Path of the calibration file lc_savefbr writes for a spectrometer.
+    """
+    return os.path.join(i_directory, 'Sp_%s.txt' % i_serialnumber)
+
+
+def _serialnumber(i_path):
+    name = os.path.splitext(os.path.basename(i_path))[0]
+    return name[3:] if name.startswith('Sp_') else name
+
+
+def read_table(i_path):
+    """
+    Standard lamp calibration file (lc_savefbr/lc_readfbr), parsed once and cached by
+    serial number until the file is modified. The two column format is assumed, see
+    Calibration, a file with other columns, less than 2 rows or wavelengths not strictly
+    increasing raises ValueError instead of being read partially.
+    :return:  Tuple (wavelength, factor) arrays, shared by all callers, do not modify.
+    """
+    serialnumber = _serialnumber(i_path)
+    modified = os.stat(i_path).st_mtime_ns
+    with _TABLES_LOCK:
+        entry = _TABLES.get(serialnumber)
+        if entry is not None and entry[0] == i_path and entry[1] == modified:
+            return entry[2], entry[3]
+    try:
+        table = np.loadtxt(i_path, ndmin=2)
+    except ValueError as error:
+        raise ValueError('%s is not a numeric calibration table: %s' % (i_path, error)) from None
+    if table.shape[1] != 2 or len(table) < 2:
+        raise ValueError('%s has %d rows of %d columns, expected wavelength and factor columns'
+                         % (i_path, len(table), table.shape[1]))
+    if not np.all(np.diff(table[:, 0]) > 0):
+        raise ValueError('%s has wavelengths that are not strictly increasing' % i_path)
+    wavelength, factor = table[:, 0].copy(), table[:, 1].copy()
+    wavelength.flags.writeable = factor.flags.writeable = False
+    with _TABLES_LOCK:
+        _TABLES[serialnumber] = (i_path, modified, wavelength, factor)
+    return wavelength, factor
+
+
+def write_table(i_directory, i_serialnumber, i_wavelength, i_factor):
+    """
+    Write a calibration file in the lc_savefbr format, readable with lc_readfbr.
+    :return:  Path of the file.
+    """
+    path = calibration_file(i_directory, i_serialnumber)
+    np.savetxt(path, np.column_stack((i_wavelength, i_factor)), delimiter='\t')
+    return path
+
+
+def derive(i_wavelength, i_counts, i_integration, i_almpsp, i_almpwave):
+    """
+    Response factors from a standard lamp measurement, the computation of lc_almp.
+    :param i_wavelength:  Device wavelength grid in nm (item 801).
+    :param i_counts:  Dark subtracted counts of the lamp, one spectrum or an array
+    (frames, pixels) which is averaged.
+    :param i_integration:  Double, integration time of the counts in ms.
+    :param i_almpsp:  Spectral radiance of the standard lamp.
+    :param i_almpwave:  Wavelengths in nm of i_almpsp.
+    :return:  Factor array, 0 where the counts are 0.
+    """
+    if len(i_almpsp) != len(i_almpwave) or len(i_almpsp) < 2:
+        raise ValueError('Lamp radiance and wavelength arrays must have the same length of at least 2')
+    counts = np.atleast_2d(np.asarray(i_counts, dtype=np.float64)).mean(axis=0)
+    radiance = np.interp(i_wavelength, np.asarray(i_almpwave, dtype=np.float64),
+                         np.asarray(i_almpsp, dtype=np.float64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nan_to_num(radiance / (counts / i_integration), posinf=0.0, neginf=0.0)
+
+
+class Calibration:
+    """
+    Offline replacement of the calibration done by the library in lc_measure, for whole
+    batches of raw counts (lc_getspectrum with dark mode 0):
+    calibrated = (raw - dark) / integration x factor x zoom.
+    The model and the calibration file format (tab separated wavelength and factor columns
+    in Sp_<serial>.txt) are assumptions taken from lc_simulator. They have not been checked
+    against files written by the spectrometer library or against its lc_measure output,
+    verify them with compare on recorded spectra before relying on the results.
+    Smoothing (i_smooth of lc_measure) is not part of it, see lc_processing.
+    """
+    def __init__(self, i_wavelength, i_factor, i_zoom=1.0, i_factorwavelength=None):
+        """
+        :param i_wavelength:  Device wavelength grid in nm (item 801).
+        :param i_factor:  Response factors, on the device grid or on i_factorwavelength.
+        :param i_zoom:  Double, the overall scaling factor (lc_setzoomfactor).
+        :param i_factorwavelength:  Wavelengths of i_factor if it is not on the device grid.
+        """
+        self.wavelength = np.ascontiguousarray(i_wavelength, dtype=np.float64)
+        factor = np.asarray(i_factor, dtype=np.float64)
+        if i_factorwavelength is not None:
+            factor = np.interp(self.wavelength, i_factorwavelength, factor)
+        if factor.shape != self.wavelength.shape:
+            raise ValueError('Expected %d factors' % len(self.wavelength))
+        self.factor = factor
+        self.zoom = i_zoom
+        self.scale = factor * i_zoom
+
+    @classmethod
+    def from_file(cls, i_path, i_wavelength, i_zoom=1.0):
+        """
+        Calibration from a lc_savefbr file (see read_table).
+        """
+        wavelength, factor = read_table(i_path)
+        return cls(i_wavelength, factor, i_zoom, wavelength)
+
+    @classmethod
+    def from_serialnumber(cls, i_directory, i_serialnumber, i_wavelength, i_zoom=1.0):
+        """
+        Calibration from the Sp_<serial number>.txt file in i_directory.
+        """
+        return cls.from_file(calibration_file(i_directory, i_serialnumber), i_wavelength, i_zoom)
+
+    def apply(self, i_raw, i_integration, i_dark=None, i_out=None):
+        """
+        :param i_raw:  Raw counts, array (spectra, pixels) or a single spectrum.
+        :param i_integration:  Integration time in ms, one value or one per spectrum.
+        :param i_dark:  Dark counts subtracted, one value, one spectrum or one per spectrum.
+        None if the counts are dark subtracted already.
+        :param i_out:  Optional float64 array (spectra, pixels) receiving the result, may
+        be i_raw itself.
+        :return:  Calibrated spectra (spectra, pixels).
+        """
+        raw = np.atleast_2d(np.asarray(i_raw, dtype=np.float64))
+        if i_dark is None:
+            out = np.multiply(raw, self.scale, out=i_out)
+        else:
+            out = np.subtract(raw, i_dark, out=i_out)
+            out *= self.scale
+        integration = np.asarray(i_integration, dtype=np.float64)
+        out /= integration[:, None] if integration.ndim else integration
+        return out
+
+
+def compare(i_calibrated, i_recorded):
+    """
+    Accuracy check against spectra recorded from the .net library, the check the assumed
+    model and file format (see Calibration) still need.
+    :param i_calibrated:  Spectra (spectra, pixels) as returned by Calibration.apply.
+    :param i_recorded:  lc_measuredate item 802 of the same measurements, taken with the
+    same calibration file, zoom factor, integration time and no smoothing.
+    :return:  Tuple (largest absolute error, largest error relative to the peak of the
+    recorded spectrum).
+    """
+    calibrated = np.atleast_2d(np.asarray(i_calibrated, dtype=np.float64))
+    recorded = np.atleast_2d(np.asarray(i_recorded, dtype=np.float64))
+    if calibrated.shape != recorded.shape:
+        raise ValueError('Shapes %s and %s differ' % (calibrated.shape, recorded.shape))
+    difference = np.abs(calibrated - recorded)
+    peak = np.abs(recorded).max(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(peak > 0, difference.max(axis=1) / peak, np.nan)
+    return float(difference.max()), float(np.nanmax(relative)) if np.isfinite(relative).any() else float('nan')
@@ -0,0 +1,391 @@
+import functools
+import os
+
+import numpy as np
+
+
+# CIE tables shipped with the module, name -> file in DATA_DIRECTORY.
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+TABLES = {'cmf': 'cie1931_2deg.csv', 'tcs': 'cie133_tcs.csv', 'daylight': 'cie_daylight.csv',
+          'illuminants': 'cie_illuminants.csv'}
+
+# Selects the analytic fit instead of the colour matching function table.
+ANALYTIC = 'analytic'
+
+# Multi-lobe Gaussian fit of the CIE 1931 2 degree colour matching functions (Wyman, Sloan,
+# Shirley 2013), only used on request (i_cmf=ANALYTIC), (scale, mean, sigma below mean,
+# sigma above mean) per lobe.
+_CMF_LOBES = (
+    ((1.056, 599.8, 37.9, 31.0), (0.362, 442.0, 16.0, 26.7), (-0.065, 501.1, 20.4, 26.2)),
+    ((0.821, 568.8, 46.9, 40.5), (0.286, 530.9, 16.3, 31.1)),
+    ((1.217, 437.0, 11.8, 36.0), (0.681, 459.0, 26.0, 13.8)),
+)
+
+# Wavelength range in which the analytic fit gives a usable spectral locus. Outside of it
+# the fitted locus folds back, the dominant wavelength is NaN for spectra with more than
+# _FIT_SHARE of their tristimulus sum there.
+_FIT_LOCUS = (430.0, 645.0)
+_FIT_SHARE = 0.15
+
+COLORIMETRY_ITEMS = (0, 1, *range(2, 22), *range(31, 47))
+
+_CCT_ITEMS = {11, 12, *range(31, 47)}
+_PEAK_ITEMS = set(range(13, 19))
+_DOMINANT_ITEMS = set(range(19, 22))
+_CRI_ITEMS = set(range(31, 47))
+
+# Engines already built, keyed by the contents of the wavelength grid and tables.
+_ENGINES = {}
+
+
+def cmf_1931(i_wavelength):
+    """
+    CIE 1931 colour matching functions from the analytic fit.
+    :param i_wavelength:  Wavelengths in nm.
+    :return:  Array (len(i_wavelength), 3) with x, y and z bar.
+    """
+    wavelength = np.asarray(i_wavelength, dtype=np.float64)
+    cmf = np.zeros(wavelength.shape + (3,))
+    for column, lobes in enumerate(_CMF_LOBES):
+        for scale, mean, low, high in lobes:
+            sigma = np.where(wavelength < mean, low, high)
+            cmf[..., column] += scale * np.exp(-0.5 * ((wavelength - mean) / sigma) ** 2)
+    return cmf
+
+
+def planck(i_wavelength, i_temperature):
+    """
+    Blackbody spectral radiance.
+    :param i_wavelength:  Wavelengths in nm.
+    :param i_temperature:  Temperature(s) in Kelvin, one output row per temperature.
+    :return:  Array (len(i_temperature), len(i_wavelength)).
+    """
+    wavelength = np.asarray(i_wavelength, dtype=np.float64) * 1e-9
+    temperature = np.atleast_1d(np.asarray(i_temperature, dtype=np.float64))[:, None]
+    with np.errstate(over='ignore'):
+        return 3.741771852e-16 * wavelength ** -5 / np.expm1(1.438776877e-2 / (wavelength * temperature))
+
+
+def load_table(i_path, i_delimiter=None):
+    """
+    Read a CIE table, first column wavelength in nm, following columns the values.
+    :return:  Tuple (wavelengths, values), values is two dimensional.
+    """
+    table = np.loadtxt(i_path, delimiter=i_delimiter, ndmin=2)
+    return table[:, 0], table[:, 1:]
+
+
+@functools.lru_cache(maxsize=None)
+def default_table(i_name):
+    """
+    CIE table shipped in DATA_DIRECTORY, read once.
+    :param i_name:  Key of TABLES: 'cmf' (CIE 1931 2 degree observer), 'tcs' (CIE 13.3 test
+    colour samples TCS01~TCS15), 'daylight' (S0, S1, S2) or 'illuminants' (A, D65, F2, F7,
+    F11, reference spectra).
+    :return:  Tuple (wavelengths, values) as load_table, shared by all callers, do not modify.
+    """
+    wavelength, values = load_table(os.path.join(DATA_DIRECTORY, TABLES[i_name]), ',')
+    wavelength.flags.writeable = values.flags.writeable = False
+    return wavelength, values
+
+
+def _interpolate(i_table, i_wavelength):
+    wavelength, values = i_table
+    values = np.asarray(values, dtype=np.float64).reshape(len(wavelength), -1)
+    return np.stack([np.interp(i_wavelength, wavelength, column, left=0.0, right=0.0) for column in values.T],
+                    axis=1)
+
+
+def _uv(i_xyz):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = i_xyz[..., 0] + 15 * i_xyz[..., 1] + 3 * i_xyz[..., 2]
+        return 4 * i_xyz[..., 0] / denominator, 6 * i_xyz[..., 1] / denominator
+
+
+def peak(i_spectra, i_wavelength):
+    """
+    Peak items of a batch of spectra, the half maximum crossings are searched on both sides
+    of the highest pixel and interpolated linearly.
+    :param i_spectra:  Array (spectra, pixels).
+    :param i_wavelength:  Wavelength grid in nm of the pixels.
+    :return:  Dictionary item code (13~18) -> array with one value per spectrum.
+    """
+    wavelength = np.asarray(i_wavelength, dtype=np.float64)
+    rows = np.arange(len(i_spectra))
+    last = i_spectra.shape[1] - 1
+    pixels = np.arange(last + 1, dtype=np.float64)
+    pixel = i_spectra.argmax(axis=1)
+    top = i_spectra[rows, pixel]
+    before = i_spectra[rows, np.maximum(pixel - 1, 0)]
+    after = i_spectra[rows, np.minimum(pixel + 1, last)]
+    curvature = before - 2 * top + after
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shift = np.clip(np.where(curvature < 0, (before - after) / (2 * curvature), 0.0), -0.5, 0.5)
+
+    half = top / 2
+    below = i_spectra < half[:, None]
+    columns = np.arange(last + 1)
+    left = np.where(below & (columns < pixel[:, None]), columns, -1).max(axis=1) + 1
+    right = np.where(below & (columns > pixel[:, None]), columns, last + 1).min(axis=1) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        outside = i_spectra[rows, np.maximum(left - 1, 0)]
+        inside = i_spectra[rows, left]
+        left_position = np.where(left > 0, left - (inside - half) / (inside - outside), 0.0)
+        outside = i_spectra[rows, np.minimum(right + 1, last)]
+        inside = i_spectra[rows, right]
+        right_position = np.where(right < last, right + (inside - half) / (inside - outside), last)
+    fwhm = np.interp(right_position, pixels, wavelength) - np.interp(left_position, pixels, wavelength)
+    return {13: np.interp(pixel + shift, pixels, wavelength), 14: fwhm,
+            15: top - (before - after) * shift / 4, 16: pixel.astype(np.float64),
+            17: wavelength[pixel], 18: top}
+
+
+def _table_key(i_table):
+    if i_table is None or isinstance(i_table, str):
+        return i_table
+    return tuple(np.ascontiguousarray(part, dtype=np.float64).tobytes() for part in i_table)
+
+
+def get_engine(i_wavelength, i_cmf=None, i_tcs=None, i_daylight=None):
+    """
+    Colorimetry engine for a wavelength grid, built once and cached by the contents of the
+    grid and tables. Parameters as for Colorimetry.
+    """
+    wavelength = np.ascontiguousarray(i_wavelength, dtype=np.float64)
+    key = (wavelength.tobytes(), _table_key(i_cmf), _table_key(i_tcs), _table_key(i_daylight))
+    engine = _ENGINES.get(key)
+    if engine is None:
+        engine = _ENGINES[key] = Colorimetry(wavelength, i_cmf, i_tcs, i_daylight)
+    return engine
+
+
+class Colorimetry:
+    """
+    Vectorized computation of the lc_measuredate colorimetric items from calibrated spectra
+    (items 801/802), for a whole batch of spectra at once and without the .net library.
+    The CIE tables (the shipped ones by default, see default_table) are interpolated onto the
+    device wavelength grid when the engine is built. Results are keyed by the lc_measuredate
+    item codes.
+    """
+    def __init__(self, i_wavelength, i_cmf=None, i_tcs=None, i_daylight=None, i_white=(1 / 3, 1 / 3),
+                 i_temperatures=(1000.0, 25000.0, 1000)):
+        """
+        :param i_wavelength:  Device wavelength grid in nm (item 801).
+        :param i_cmf:  Table (wavelengths, values (n, 3)) of the CIE 1931 colour matching
+        functions, the shipped table if None. ANALYTIC selects the analytic fit, an
+        approximation for quick estimates: items 19~21 are NaN with it for colours it can not
+        resolve, spectra with much of their power outside of 430~645 nm and colours
+        towards the purple line.
+        :param i_tcs:  Table (wavelengths, values (n, 15)) of the CIE 13.3 test colour
+        samples, the shipped table if None.
+        :param i_daylight:  Table (wavelengths, values (n, 3)) of the CIE daylight components
+        S0, S1, S2, the shipped table if None.
+        :param i_white:  Chromaticity (x, y) of the white point for the dominant wavelength.
+        :param i_temperatures:  (lowest, highest, count) of the Planckian locus table used for
+        the correlated colour temperature.
+        """
+        self.wavelength = np.ascontiguousarray(i_wavelength, dtype=np.float64)
+        self.weights = np.gradient(self.wavelength)
+        self.analytic = isinstance(i_cmf, str) and i_cmf == ANALYTIC
+        if self.analytic:
+            cmf = cmf_1931(self.wavelength)
+            locus_wavelength = np.arange(_FIT_LOCUS[0], _FIT_LOCUS[1] + 1)
+            locus = cmf_1931(locus_wavelength)
+        else:
+            table = default_table('cmf') if i_cmf is None else i_cmf
+            cmf = _interpolate(table, self.wavelength)
+            locus_wavelength = np.arange(380.0, 781.0)
+            locus = _interpolate(table, locus_wavelength)
+        self.cmf = cmf * self.weights[:, None]
+        self.fit_outside = (self.wavelength < _FIT_LOCUS[0]) | (self.wavelength > _FIT_LOCUS[1])
+
+        total = locus.sum(axis=1)
+        valid = total > total.max() * 1e-4
+        self.locus_wavelength = locus_wavelength[valid]
+        self.locus = locus[valid, :2] / total[valid, None]
+        self.white = np.asarray(i_white, dtype=np.float64)
+
+        lowest, highest, count = i_temperatures
+        self.log_temperature = np.linspace(np.log(lowest), np.log(highest), count)
+        self.log_step = self.log_temperature[1] - self.log_temperature[0]
+        self.planck_uv = np.stack(_uv(planck(self.wavelength, np.exp(self.log_temperature)) @ self.cmf), axis=1)
+
+        tcs = _interpolate(default_table('tcs') if i_tcs is None else i_tcs, self.wavelength)
+        self.tcs = tcs.shape[1]
+        # Pixels x (sample, xyz), one matrix product gives all sample tristimulus values.
+        self.tcs_cmf = (tcs[:, :, None] * self.cmf[:, None, :]).reshape(len(self.wavelength), -1)
+        self.daylight = _interpolate(default_table('daylight') if i_daylight is None else i_daylight,
+                                     self.wavelength).T
+
+    def compute(self, i_spectra, i_items=None, i_chunk=4096):
+        """
+        :param i_spectra:  Array (spectra, pixels) or a single spectrum.
+        :param i_items:  Iterable of item codes, all of COLORIMETRY_ITEMS if None. Pixel
+        items 16~18 refer to the pixels of the given spectra.
+        :param i_chunk:  Number of spectra processed at once, bounds the temporary memory.
+        :return:  Dictionary item code -> array with one value per spectrum, empty arrays
+        for an empty batch.
+        """
+        spectra = np.atleast_2d(np.asarray(i_spectra, dtype=np.float64))
+        items = COLORIMETRY_ITEMS if i_items is None else tuple(i_items)
+        if len(spectra) == 0:
+            return {item: np.empty(0) for item in items}
+        parts = [self._compute(spectra[start:start + i_chunk], items)
+                 for start in range(0, len(spectra), i_chunk)]
+        if len(parts) == 1:
+            return parts[0]
+        return {item: np.concatenate([part[item] for part in parts]) for item in items}
+
+    def _compute(self, i_spectra, i_items):
+        wanted = set(i_items)
+        results = {}
+        xyz = i_spectra @ self.cmf
+        x, y, z = xyz.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            total = x + y + z
+            cx, cy = x / total, y / total
+        u, v = _uv(xyz)
+        results.update({0: i_spectra @ self.weights, 1: 683.0 * y, 2: x, 3: y, 4: z, 5: cx, 6: cy,
+                        7: u, 8: v, 9: u, 10: 1.5 * v})
+        if wanted & _CCT_ITEMS:
+            results[11], results[12] = self._cct(u, v)
+        if wanted & _PEAK_ITEMS:
+            results.update(peak(i_spectra, self.wavelength))
+        if wanted & _DOMINANT_ITEMS:
+            dominant = self._dominant(np.stack((cx, cy), axis=1))
+            if self.analytic:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    share = (i_spectra[:, self.fit_outside] @ self.cmf[self.fit_outside]).sum(axis=1) / total
+                unresolved = ~(share <= _FIT_SHARE) | (dominant[0] == 0)
+                dominant = [np.where(unresolved, np.nan, values) for values in dominant]
+            results[19], results[20], results[21] = dominant
+        if wanted & _CRI_ITEMS:
+            results.update(self._cri(i_spectra, results[11]))
+        return {item: results[item] for item in i_items}
+
+    def _cct(self, i_u, i_v):
+        """
+        Nearest point of the Planckian locus table refined by a parabola through the squared
+        distances of its neighbours.
+        """
+        squared = (i_u[:, None] - self.planck_uv[:, 0]) ** 2 + (i_v[:, None] - self.planck_uv[:, 1]) ** 2
+        rows = np.arange(len(i_u))
+        nearest = np.clip(np.nanargmin(np.nan_to_num(squared, nan=np.inf), axis=1), 1, len(self.planck_uv) - 2)
+        before, centre, after = (squared[rows, nearest - 1], squared[rows, nearest], squared[rows, nearest + 1])
+        curvature = before - 2 * centre + after
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shift = np.clip(np.where(curvature > 0, (before - after) / (2 * curvature), 0.0), -1.0, 1.0)
+        cct = np.exp(self.log_temperature[nearest] + shift * self.log_step)
+        distance = np.sqrt(np.maximum(centre - (before - after) * shift / 4, 0.0))
+        duv = np.where(i_v >= self.planck_uv[nearest, 1], distance, -distance)
+        return cct, duv
+
+    def _dominant(self, i_xy):
+        """
+        Intersection of the ray from the white point through the colour with the spectral
+        locus, closed by the purple line. Colours towards the purple line get the
+        complementary wavelength, found with the opposite ray.
+        """
+        start = self.locus
+        edge = np.roll(self.locus, -1, axis=0) - start
+        purple = len(start) - 1
+        direction = i_xy - self.white
+        offset = start - self.white
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denominator = direction[:, None, 0] * edge[:, 1] - direction[:, None, 1] * edge[:, 0]
+            distance = (offset[:, 0] * edge[:, 1] - offset[:, 1] * edge[:, 0]) / denominator
+            position = (offset[:, 0] * direction[:, None, 1] - offset[:, 1] * direction[:, None, 0]) / denominator
+        on_edge = (position >= 0) & (position <= 1)
+        # The outermost intersection, the locus is not exactly convex at its ends.
+        forward = np.where(on_edge & (distance > 0), distance, -np.inf)
+        backward = np.where(on_edge & (distance < 0), -distance, -np.inf)
+        backward[:, purple] = -np.inf
+        rows = np.arange(len(i_xy))
+        hit = forward.argmax(axis=1)
+        opposite = backward.argmax(axis=1)
+        has_dominant = hit != purple
+        segment = np.where(has_dominant, hit, opposite)
+        following = np.minimum(segment + 1, purple)
+        wavelength = (self.locus_wavelength[segment] + position[rows, segment] *
+                      (self.locus_wavelength[following] - self.locus_wavelength[segment]))
+        reach = forward[rows, hit]
+        found = np.isfinite(reach) & np.isfinite(np.where(has_dominant, reach, backward[rows, opposite]))
+        with np.errstate(divide='ignore'):
+            purity = np.where(found, 1 / reach, np.nan)
+        return has_dominant.astype(np.float64), np.where(found, wavelength, np.nan), purity
+
+    def _reference(self, i_cct):
+        reference = planck(self.wavelength, i_cct)
+        daylight = i_cct >= 5000
+        t = i_cct[daylight]
+        x = np.where(t <= 7000,
+                     -4.6070e9 / t ** 3 + 2.9678e6 / t ** 2 + 0.09911e3 / t + 0.244063,
+                     -2.0064e9 / t ** 3 + 1.9018e6 / t ** 2 + 0.24748e3 / t + 0.237040)
+        y = -3.000 * x ** 2 + 2.870 * x - 0.275
+        m = 0.0241 + 0.2562 * x - 0.7341 * y
+        m1 = (-1.3515 - 1.7703 * x + 5.9114 * y) / m
+        m2 = (0.0300 - 31.4424 * x + 30.0717 * y) / m
+        reference[daylight] = self.daylight[0] + m1[:, None] * self.daylight[1] + m2[:, None] * self.daylight[2]
+        return reference
+
+    def _cri(self, i_spectra, i_cct):
+        """
+        CIE 13.3 colour rendering indices with von Kries adaptation in the 1960 UCS.
+        """
+        count = len(i_spectra)
+        results = {item: np.full(count, np.nan) for item in _CRI_ITEMS}
+        uvw = []
+        for illuminant in (i_spectra, self._reference(i_cct)):
+            white = illuminant @ self.cmf
+            scale = 100 / white[:, 1]
+            samples = (illuminant @ self.tcs_cmf).reshape(count, self.tcs, 3) * scale[:, None, None]
+            uvw.append((np.stack(_uv(white), axis=1), np.stack(_uv(samples), axis=2), samples[:, :, 1]))
+        (test_white, test_uv, test_y), (reference_white, reference_uv, reference_y) = uvw
+
+        def cd(i_uv):
+            u, v = i_uv[..., 0], i_uv[..., 1]
+            return (4 - u - 10 * v) / v, (1.708 * v + 0.404 - 1.481 * u) / v
+
+        c_test, d_test = cd(test_white)
+        c_reference, d_reference = cd(reference_white)
+        c_sample, d_sample = cd(test_uv)
+        c_sample = c_sample * (c_reference / c_test)[:, None]
+        d_sample = d_sample * (d_reference / d_test)[:, None]
+        denominator = 16.518 + 1.481 * c_sample - d_sample
+        adapted_u = (10.872 + 0.404 * c_sample - 4 * d_sample) / denominator
+        adapted_v = 5.520 / denominator
+
+        def uvw_star(i_u, i_v, i_y):
+            w = 25 * np.cbrt(i_y) - 17
+            return (13 * w * (i_u - reference_white[:, None, 0]), 13 * w * (i_v - reference_white[:, None, 1]), w)
+
+        test = uvw_star(adapted_u, adapted_v, test_y)
+        reference = uvw_star(reference_uv[..., 0], reference_uv[..., 1], reference_y)
+        difference = np.sqrt(sum((a - b) ** 2 for a, b in zip(test, reference)))
+        indices = 100 - 4.6 * difference
+        for sample in range(min(self.tcs, 15)):
+            results[32 + sample] = indices[:, sample]
+        if self.tcs >= 8:
+            results[31] = indices[:, :8].mean(axis=1)
+        return results
+
+
+def compare(i_computed, i_recorded):
+    """
+    Accuracy check against values recorded from the .net library.
+    :param i_computed:  Dictionary item code -> array, as returned by Colorimetry.compute.
+    :param i_recorded:  Dictionary item code -> array of lc_measuredate values for the same
+    spectra.
+    :return:  Dictionary item code -> (largest absolute error, largest relative error).
+    """
+    errors = {}
+    for item, recorded in i_recorded.items():
+        if item not in i_computed:
+            continue
+        recorded = np.asarray(recorded, dtype=np.float64)
+        difference = np.abs(i_computed[item] - recorded)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative = np.where(recorded != 0, difference / np.abs(recorded), np.nan)
+        errors[item] = (float(np.nanmax(difference)), float(np.nanmax(relative)) if np.isfinite(relative).any()
+                        else float('nan'))
+    return errors
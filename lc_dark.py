@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+from Py_LcSpvis import BlockingFunctions, DeviceLocks
+
+
+class DarkCache(DeviceLocks):
+    """
+    Dark reference manager, a dark spectrum is captured with lc_oncedark only when the one
+    a measurement needs is missing or stale, instead of before every measurement.
+    A dark reference is identified by (device index, integration time, averaging) and is
+    stale when it is older than i_maxage seconds or has been used i_maxuses times. The
+    library holds one once-dark per device, so capturing a dark with other settings
+    replaces the entry of that device. At most i_capacity devices are tracked, the least
+    recently used one is evicted.
+    """
+    def __init__(self, i_maxage=60.0, i_maxuses=None, i_capacity=16):
+        """
+        :param i_maxage:  Seconds after which a dark reference is recaptured, None for never.
+        :param i_maxuses:  Number of uses after which a dark reference is recaptured, None for
+        unlimited.
+        :param i_capacity:  Maximum number of cached entries.
+        """
+        self.maxage = i_maxage
+        self.maxuses = i_maxuses
+        self.capacity = i_capacity
+        # Device index -> (key, capture time, number of uses), in least recently used order.
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self.capture_time = 0.0
+
+    def _stale(self, i_entry, i_now):
+        _, captured, uses = i_entry
+        return ((self.maxage is not None and i_now - captured >= self.maxage) or
+                (self.maxuses is not None and uses >= self.maxuses))
+
+    def ensure(self, i_index, i_integration, i_averaging):
+        """
+        Make sure the device holds a fresh dark reference for the given settings, capturing
+        one with lc_oncedark if needed.
+        :param i_index:  Integer, the selected spectrometer's index
+        :param i_integration:  Double precision floating-point, integration time
+        :param i_averaging:  Integer, number of averages
+        :return:  Return code of lc_oncedark, ERR_SUCCESS = 0 for a cache hit.
+        """
+        key = (i_index, i_integration, i_averaging)
+        with self.device_lock(i_index):
+            with self.lock:
+                entry = self.entries.get(i_index)
+                if entry is not None and entry[0] == key and not self._stale(entry, time.monotonic()):
+                    self.entries[i_index] = (key, entry[1], entry[2] + 1)
+                    self.entries.move_to_end(i_index)
+                    self.hits += 1
+                    return 0
+            start = time.perf_counter()
+            ret = BlockingFunctions.lc_oncedark(i_index, i_integration, i_averaging)
+            with self.lock:
+                self.capture_time += time.perf_counter() - start
+                if ret != 0:
+                    self.entries.pop(i_index, None)
+                    return ret
+                if entry is not None and entry[0] == key:
+                    self.refreshes += 1
+                else:
+                    self.misses += 1
+                self.entries[i_index] = (key, time.monotonic(), 1)
+                self.entries.move_to_end(i_index)
+                while len(self.entries) > self.capacity:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+            return ret
+
+    def measure(self, i_index, i_integration, i_averaging, i_aux, i_smooth):
+        """
+        lc_measure with single dark subtraction (dark mode 2), capturing the dark reference
+        only when needed.
+        :return:  Return code of lc_oncedark if it failed, otherwise of lc_measure.
+        """
+        ret = self.ensure(i_index, i_integration, i_averaging)
+        if ret != 0:
+            return ret
+        return BlockingFunctions.lc_measure(i_index, i_integration, i_averaging, 2, i_aux, i_smooth)
+
+    def invalidate(self, i_index=None):
+        """
+        Forget the dark reference of one device, or of all devices if i_index is None.
+        """
+        with self.lock:
+            if i_index is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(i_index, None)
+
+    def statistics(self):
+        """
+        :return:  Dictionary with hit, miss, refresh and eviction counts, the hit ratio and
+        the seconds spent capturing dark references.
+        """
+        with self.lock:
+            total = self.hits + self.misses + self.refreshes
+            return {'hits': self.hits, 'misses': self.misses, 'refreshes': self.refreshes,
+                    'evictions': self.evictions, 'hit_ratio': self.hits / total if total else 0.0,
+                    'capture_time': self.capture_time}
@@ -0,0 +1,147 @@
+import math
+import threading
+import time
+
+from Py_LcSpvis import BlockingFunctions, DeviceLocks
+
+
+class AutoExposure(DeviceLocks):
+    """
+    Auto-exposure search built on lc_getsaturation, replacement for lc_autointegration.
+    The saturation is close to linear in the integration time, so after a proportional
+    first step a secant search converges in a few probes. The last converged integration
+    time and averaging is remembered per (device index, recipe) and used as the starting
+    point of the next search, consecutive DUTs of one product then need a single probe.
+    Saturation values use the scale returned by lc_getsaturation.
+    """
+    def __init__(self, i_target, i_tolerance=0.05, i_maxprobes=8, i_start=10.0, i_minintegration=0.1,
+                 i_maxintegration=5000.0, i_maxaveraging=100, i_mintime=0.0, i_clip=None):
+        """
+        :param i_target:  Double, the target saturation level.
+        :param i_tolerance:  Double, accepted relative deviation from the target.
+        :param i_maxprobes:  Integer, maximum number of lc_getsaturation calls per search.
+        :param i_start:  Double, integration time of the first probe without memo entry.
+        :param i_minintegration:  Double, lower integration time limit.
+        :param i_maxintegration:  Double, upper integration time limit, also set with
+        lc_setautomaxintegration.
+        :param i_maxaveraging:  Integer, upper averaging limit, also set with
+        lc_setautomaxintegration.
+        :param i_mintime:  Double, minimum total measurement time (integration x averaging)
+        used to choose the averaging count.
+        :param i_clip:  Double, saturation regarded as clipped, default 1.25 x target. Full
+        scale (1.0) is always regarded as clipped.
+        """
+        self.target = i_target
+        self.tolerance = i_tolerance
+        self.maxprobes = i_maxprobes
+        self.start = i_start
+        self.minintegration = i_minintegration
+        self.maxintegration = i_maxintegration
+        self.maxaveraging = i_maxaveraging
+        self.mintime = i_mintime
+        self.clip = min(i_target * 1.25 if i_clip is None else i_clip, 1.0)
+        # (device index, recipe) -> (integration, averaging)
+        self.memo = {}
+        self.configured = set()
+        # Guards memo, configured, the limits and the statistics, never held during calls.
+        self.lock = threading.Lock()
+        self.probes = 0
+        self.elapsed = 0.0
+        self.searches = 0
+        self.total_probes = 0
+        self.total_elapsed = 0.0
+
+    def _configure(self, i_index):
+        with self.lock:
+            if i_index in self.configured:
+                return 0
+            maxintegration, maxaveraging = self.maxintegration, self.maxaveraging
+        ret, maxintegration, maxaveraging = BlockingFunctions.lc_setautomaxintegration(
+            i_index, maxintegration, maxaveraging)
+        if ret == 0:
+            with self.lock:
+                self.maxintegration = min(self.maxintegration, maxintegration)
+                self.maxaveraging = min(self.maxaveraging, maxaveraging)
+                self.configured.add(i_index)
+        return ret
+
+    def _next(self, i_integration, i_saturation, i_previous):
+        if i_saturation >= self.clip:
+            return i_integration / 4
+        if i_previous is not None and i_previous[1] < self.clip and i_previous[1] != i_saturation:
+            slope = (i_saturation - i_previous[1]) / (i_integration - i_previous[0])
+            if slope > 0:
+                return i_integration + (self.target - i_saturation) / slope
+        return i_integration * self.target / max(i_saturation, self.target * 1e-3)
+
+    def autointegration(self, i_index, i_recipe=None):
+        """
+        Search the integration time giving the target saturation.
+        :param i_index:  Integer, the selected spectrometer's index
+        :param i_recipe:  Hashable product/recipe key for the warm start memo.
+        :return:  Tuple (return code, integration time, averaging count), like
+        lc_autointegration. The number of probes and the seconds spent are stored in probes
+        and elapsed.
+        Success：ERR_SUCCESS = 0
+        Failure：return code of lc_setautomaxintegration or lc_getsaturation
+        ERR_INVALID_AUTO_INT= -22 if the target was not reached
+        """
+        with self.device_lock(i_index):
+            start = time.perf_counter()
+            probes = 0
+            try:
+                ret = self._configure(i_index)
+                if ret != 0:
+                    return ret, 0.0, 0
+                key = (i_index, i_recipe)
+                with self.lock:
+                    integration = self.memo.get(key, (self.start, 1))[0]
+                    minintegration, maxintegration = self.minintegration, self.maxintegration
+                previous = None
+                while probes < self.maxprobes:
+                    ret, saturation = BlockingFunctions.lc_getsaturation(i_index, integration, 1, 0.0)
+                    probes += 1
+                    if ret != 0:
+                        return ret, 0.0, 0
+                    if abs(saturation - self.target) <= self.tolerance * self.target:
+                        with self.lock:
+                            averaging = max(1, min(self.maxaveraging, math.ceil(self.mintime / integration)))
+                            self.memo[key] = (integration, averaging)
+                        return ret, integration, averaging
+                    following = min(max(self._next(integration, saturation, previous), minintegration),
+                                    maxintegration)
+                    if following == integration:
+                        break
+                    previous = (integration, saturation)
+                    integration = following
+                return -22, integration, 1
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.probes = probes
+                    self.elapsed = elapsed
+                    self.searches += 1
+                    self.total_probes += probes
+                    self.total_elapsed += elapsed
+
+    def forget(self, i_index=None, i_recipe=None):
+        """
+        Drop memo entries of one device and recipe, of one device, or all of them.
+        """
+        with self.lock:
+            if i_index is None:
+                self.memo.clear()
+            elif i_recipe is None:
+                for key in [key for key in self.memo if key[0] == i_index]:
+                    del self.memo[key]
+            else:
+                self.memo.pop((i_index, i_recipe), None)
+
+    def statistics(self):
+        """
+        :return:  Dictionary with the number of searches, total and mean probes and seconds.
+        """
+        with self.lock:
+            searches = max(self.searches, 1)
+            return {'searches': self.searches, 'probes': self.total_probes, 'elapsed': self.total_elapsed,
+                    'mean_probes': self.total_probes / searches, 'mean_elapsed': self.total_elapsed / searches}
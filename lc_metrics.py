@@ -0,0 +1,213 @@
+import functools
+import http.server
+import inspect
+import os
+import threading
+import time
+
+from Py_LcSpvis import BlockingFunctions, MeasureResult
+
+
+# Histogram bucket upper bounds in seconds.
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+# Functions without device index argument.
+_UNINDEXED = ('lc_init', 'lc_doneall')
+
+
+class _Histogram:
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, i_value):
+        for position, bound in enumerate(BUCKETS):
+            if i_value <= bound:
+                self.counts[position] += 1
+                break
+        self.count += 1
+        self.sum += i_value
+
+
+def _labels(**kwargs):
+    return ','.join('%s="%s"' % (key, value) for key, value in kwargs.items())
+
+
+class Metrics:
+    """
+    Call latency histograms per function and device index, counters of the returned error
+    codes and the device reported test time (item 904) next to the measured wall time.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = {}
+            self.errors = {}
+            self.test_time = {}
+
+    def record(self, i_name, i_args, i_seconds, i_result):
+        """
+        Account one call of BlockingFunctions.i_name.
+        :param i_args:  Arguments of the call, keyword arguments bound to their position.
+        :param i_result:  Return value of the call, the exception instance if it raised.
+        """
+        index = '' if i_name in _UNINDEXED or not i_args else i_args[0]
+        code = i_result[0] if isinstance(i_result, tuple) else i_result
+        if isinstance(i_result, BaseException):
+            code = 'exception'
+        elif not isinstance(code, int) or code >= 0:
+            code = None
+        test_time = None
+        if code is None and isinstance(i_result, tuple):
+            if i_name == 'lc_measuredateall':
+                data = i_result[1]
+                if isinstance(data, MeasureResult):
+                    test_time = data.test_time
+                elif isinstance(data, dict):
+                    test_time = data.get(904)
+            elif i_name == 'lc_measuredate' and len(i_args) > 1 and i_args[1] == 904:
+                test_time = i_result[1]
+        with self.lock:
+            key = (i_name, index)
+            histogram = self.calls.get(key)
+            if histogram is None:
+                histogram = self.calls[key] = _Histogram()
+            histogram.observe(i_seconds)
+            if code is not None:
+                key = (i_name, index, code)
+                self.errors[key] = self.errors.get(key, 0) + 1
+            if test_time is not None:
+                histogram = self.test_time.get(index)
+                if histogram is None:
+                    histogram = self.test_time[index] = _Histogram()
+                histogram.observe(test_time / 1000)
+
+    def openmetrics(self):
+        """
+        :return:  String in the OpenMetrics text exposition format.
+        """
+        lines = []
+        with self.lock:
+            self._histogram(lines, 'lcspvis_call_seconds', 'Duration of BlockingFunctions calls.',
+                            {_labels(function=name, index=index): histogram
+                             for (name, index), histogram in sorted(self.calls.items(), key=str)})
+            lines += ['# TYPE lcspvis_errors counter', '# HELP lcspvis_errors Negative return codes.']
+            for (name, index, code), count in sorted(self.errors.items(), key=str):
+                lines.append('lcspvis_errors_total{%s} %d' % (_labels(function=name, index=index, code=code), count))
+            self._histogram(lines, 'lcspvis_device_test_time_seconds', 'Test time reported by the device (item 904).',
+                            {_labels(index=index): histogram for index, histogram in sorted(self.test_time.items())})
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram(i_lines, i_name, i_help, i_histograms):
+        i_lines += ['# TYPE %s histogram' % i_name, '# UNIT %s seconds' % i_name, '# HELP %s %s' % (i_name, i_help)]
+        for labels, histogram in i_histograms.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                i_lines.append('%s_bucket{%s,le="%s"} %d' % (i_name, labels, bound, cumulative))
+            i_lines.append('%s_bucket{%s,le="+Inf"} %d' % (i_name, labels, histogram.count))
+            i_lines.append('%s_count{%s} %d' % (i_name, labels, histogram.count))
+            i_lines.append('%s_sum{%s} %r' % (i_name, labels, histogram.sum))
+
+    def write(self, i_path):
+        """
+        Write the OpenMetrics text to a file, replaced atomically.
+        """
+        temporary = i_path + '.tmp'
+        with open(temporary, 'w') as file:
+            file.write(self.openmetrics())
+        os.replace(temporary, i_path)
+
+    def serve(self, i_port=9464, i_host='127.0.0.1'):
+        """
+        Serve the OpenMetrics text over HTTP from a daemon thread.
+        :return:  The HTTPServer, call shutdown() to stop it.
+        """
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.openmetrics().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((i_host, i_port), Handler)
+        threading.Thread(target=server.serve_forever, name='LcSpvis-metrics', daemon=True).start()
+        return server
+
+
+METRICS = Metrics()
+
+# Original BlockingFunctions methods while instrumentation is enabled.
+_ORIGINALS = {}
+
+
+def _positional(i_signature, i_args, i_kwargs):
+    """
+    :return:  Arguments of a call as positional tuple, keyword arguments bound to their
+    position (the device index is i_index, i_ndex for lc_getsaturation).
+    """
+    if not i_kwargs:
+        return i_args
+    try:
+        return i_signature.bind(*i_args, **i_kwargs).args
+    except TypeError:
+        return i_args
+
+
+def _instrument(i_name, i_function, i_metrics):
+    signature = inspect.signature(i_function)
+
+    @functools.wraps(i_function)
+    def call(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = i_function(*args, **kwargs)
+        except Exception as error:
+            i_metrics.record(i_name, _positional(signature, args, kwargs), time.perf_counter() - start, error)
+            raise
+        i_metrics.record(i_name, _positional(signature, args, kwargs), time.perf_counter() - start, result)
+        return result
+    return call
+
+
+def enable(i_metrics=METRICS):
+    """
+    Instrument all BlockingFunctions methods. Disabled instrumentation costs nothing, the
+    original methods are in place then.
+    :return:  The Metrics instance receiving the measurements.
+    """
+    if _ORIGINALS:
+        disable()
+    for name, value in list(vars(BlockingFunctions).items()):
+        if isinstance(value, staticmethod):
+            _ORIGINALS[name] = value
+            setattr(BlockingFunctions, name, staticmethod(_instrument(name, value.__func__, i_metrics)))
+    return i_metrics
+
+
+def disable():
+    """
+    Restore the original BlockingFunctions methods.
+    """
+    for name, value in _ORIGINALS.items():
+        setattr(BlockingFunctions, name, value)
+    _ORIGINALS.clear()
+
+
+def enabled():
+    return bool(_ORIGINALS)
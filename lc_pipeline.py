@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+from Py_LcSpvis import BlockingFunctions, _copy_array
+
+
+class _Slot:
+    __slots__ = ('result', 'spectrum', 'sequence')
+
+    def __init__(self):
+        self.result = None
+        self.spectrum = None
+        self.sequence = -1
+
+
+class Pipeline:
+    """
+    Pipelined acquisition, the next lc_measure starts while the previous frame is processed
+    on another thread.
+    The acquisition thread runs lc_measure followed by the single lc_measuredateall call
+    (the library keeps only the last measurement, so reading it out has to finish before
+    the next integration), puts the result into one of i_buffers alternating slots and
+    starts the next integration right away. The processing thread copies the spectrum into
+    the preallocated NumPy buffer of the slot and calls i_process on it. When all slots are
+    waiting for processing the acquisition waits, so memory stays bounded.
+    """
+    def __init__(self, i_index, i_integration, i_averaging, i_darkmode, i_process=None, i_aux=False, i_smooth=0,
+                 i_buffers=2):
+        """
+        :param i_index:  Integer, the selected spectrometer's index
+        :param i_integration:  Double precision floating-point number, the integration time
+        :param i_averaging:  Integer, the number of measurements to average
+        :param i_darkmode:  Integer, dark mode selection (see lc_measure)
+        :param i_process:  Function(MeasureResult, spectrum ndarray) called for every frame on
+        the processing thread, its return values are collected by run. The spectrum buffer
+        is reused once the function returns.
+        :param i_aux:  Boolean, auxiliary lamp compensation (see lc_measure)
+        :param i_smooth:  Integer, rolling smoothing pixels (see lc_measure)
+        :param i_buffers:  Integer, number of alternating result buffers, at least 2.
+        """
+        if i_buffers < 2:
+            raise ValueError('A pipeline needs at least 2 buffers')
+        self.index = i_index
+        self.integration = i_integration
+        self.averaging = i_averaging
+        self.darkmode = i_darkmode
+        self.aux = i_aux
+        self.smooth = i_smooth
+        self.process = i_process
+        self.slots = [_Slot() for _ in range(i_buffers)]
+        self.error = 0
+        self.timings = {'measure': 0.0, 'extract': 0.0, 'process': 0.0, 'wall': 0.0}
+        self.frames = 0
+
+    def _acquire(self, i_frames, i_free, i_filled, i_stop, i_raised):
+        try:
+            for sequence in range(i_frames):
+                slot = i_free.get()
+                if i_stop.is_set():
+                    return
+                start = time.perf_counter()
+                ret = BlockingFunctions.lc_measure(self.index, self.integration, self.averaging, self.darkmode,
+                                                   self.aux, self.smooth)
+                measured = time.perf_counter()
+                if ret == 0:
+                    ret, slot.result = BlockingFunctions.lc_measuredateall(self.index)
+                self.timings['measure'] += measured - start
+                self.timings['extract'] += time.perf_counter() - measured
+                if ret != 0:
+                    self.error = ret
+                    return
+                slot.sequence = sequence
+                i_filled.put(slot)
+        except Exception as error:
+            i_raised.append(error)
+        finally:
+            i_filled.put(None)
+
+    def _process(self, i_free, i_filled, i_outputs):
+        while True:
+            slot = i_filled.get()
+            if slot is None:
+                return
+            start = time.perf_counter()
+            spectrum = slot.result.spectrum
+            if slot.spectrum is None or slot.spectrum.size != len(spectrum):
+                slot.spectrum = np.empty(len(spectrum), dtype=np.float64)
+            _copy_array(spectrum, slot.spectrum)
+            if self.process is not None:
+                i_outputs.append(self.process(slot.result, slot.spectrum))
+            self.frames += 1
+            self.timings['process'] += time.perf_counter() - start
+            i_free.put(slot)
+
+    def run(self, i_frames):
+        """
+        Acquire and process i_frames frames.
+        :return:  List of the i_process return values, shorter than i_frames if a library
+        call failed (the return code is stored in error).
+        An exception raised by a library call or by i_process stops the acquisition and is
+        raised here once the acquisition thread has ended.
+        """
+        free = queue.Queue()
+        filled = queue.Queue()
+        for slot in self.slots:
+            free.put(slot)
+        outputs = []
+        stop = threading.Event()
+        raised = []
+        start = time.perf_counter()
+        acquisition = threading.Thread(target=self._acquire, args=(i_frames, free, filled, stop, raised),
+                                       name='LcSpvis-pipeline-%d' % self.index, daemon=True)
+        acquisition.start()
+        try:
+            self._process(free, filled, outputs)
+        finally:
+            # Wakes the acquisition if it waits for a slot the processing never returns.
+            stop.set()
+            free.put(None)
+            acquisition.join()
+            self.timings['wall'] += time.perf_counter() - start
+        if raised:
+            raise raised[0]
+        return outputs
+
+    def statistics(self):
+        """
+        :return:  Dictionary with the seconds spent per stage, frames per second, the ideal
+        rate 1 / (integration x averaging) and the overlap ratio, the share of the shorter
+        of acquisition and processing that was hidden behind the other (1.0 is perfect).
+        """
+        timings = dict(self.timings)
+        acquisition = timings['measure'] + timings['extract']
+        hidden = acquisition + timings['process'] - timings['wall']
+        shorter = min(acquisition, timings['process'])
+        timings['frames'] = self.frames
+        timings['rate'] = self.frames / timings['wall'] if timings['wall'] else 0.0
+        timings['ideal_rate'] = 1000.0 / (self.integration * self.averaging)
+        timings['overlap'] = min(max(hidden / shorter, 0.0), 1.0) if shorter else 0.0
+        return timings
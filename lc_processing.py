@@ -0,0 +1,198 @@
+import functools
+
+import numpy as np
+
+from Py_LcSpvis import BlockingFunctions
+from lc_colorimetry import peak
+
+
+# Resamplers already built, keyed by source and target grid.
+_RESAMPLERS = {}
+
+
+def device_parameters(i_index):
+    """
+    :return:  Tuple (pixels, starting wavelength, ending wavelength) of a spectrometer, read
+    with lc_getparameters modes 1~3.
+    """
+    values = []
+    for mode in (1, 2, 3):
+        ret, value = BlockingFunctions.lc_getparameters(i_index, mode, '')
+        if ret != 0:
+            raise RuntimeError('lc_getparameters failed with %d' % ret)
+        values.append(float(value))
+    return int(values[0]), values[1], values[2]
+
+
+class Resampler:
+    """
+    Linear interpolation of spectra from a device wavelength grid onto another grid, as a
+    precomputed sparse matrix with two non-zero entries per target wavelength (column
+    indices and weights). Applying it to a batch is two gathers and a weighted sum.
+    Target wavelengths outside the device grid are 0.
+    """
+    def __init__(self, i_wavelength, i_grid):
+        """
+        :param i_wavelength:  Increasing device wavelength grid in nm (item 801).
+        :param i_grid:  Target wavelength grid in nm.
+        """
+        self.wavelength = np.ascontiguousarray(i_wavelength, dtype=np.float64)
+        self.grid = np.ascontiguousarray(i_grid, dtype=np.float64)
+        position = np.interp(self.grid, self.wavelength, np.arange(len(self.wavelength), dtype=np.float64))
+        self.indices = np.minimum(position.astype(np.intp), len(self.wavelength) - 2)
+        fraction = position - self.indices
+        inside = (self.grid >= self.wavelength[0]) & (self.grid <= self.wavelength[-1])
+        self.weights = np.stack([(1 - fraction) * inside, fraction * inside])
+
+    def __call__(self, i_spectra, i_out=None):
+        """
+        :param i_spectra:  Array (spectra, device pixels) or a single spectrum.
+        :param i_out:  Optional array (spectra, len(grid)) receiving the result.
+        :return:  Array (spectra, len(grid)).
+        """
+        spectra = np.atleast_2d(np.asarray(i_spectra, dtype=np.float64))
+        out = np.take(spectra, self.indices, axis=1, out=i_out)
+        out *= self.weights[0]
+        out += np.take(spectra, self.indices + 1, axis=1) * self.weights[1]
+        return out
+
+
+def get_resampler(i_wavelength, i_grid):
+    """
+    Resampler for a pair of grids, built once and cached.
+    """
+    wavelength = np.ascontiguousarray(i_wavelength, dtype=np.float64)
+    grid = np.ascontiguousarray(i_grid, dtype=np.float64)
+    key = (wavelength.tobytes(), grid.tobytes())
+    resampler = _RESAMPLERS.get(key)
+    if resampler is None:
+        resampler = _RESAMPLERS[key] = Resampler(wavelength, grid)
+    return resampler
+
+
+def device_resampler(i_index, i_step=1.0, i_wavelength=None):
+    """
+    Resampler from a spectrometer onto a uniform grid of i_step nm covering its range.
+    :param i_index:  Integer, the spectrometer's index
+    :param i_wavelength:  Device wavelength grid (item 801), evenly spaced between the
+    starting and ending wavelength of lc_getparameters if None.
+    """
+    pixels, start, end = device_parameters(i_index)
+    wavelength = np.linspace(start, end, pixels) if i_wavelength is None else i_wavelength
+    grid = np.arange(np.ceil(start / i_step) * i_step, end + i_step * 1e-9, i_step)
+    return get_resampler(wavelength, grid)
+
+
+def _check_window(i_window):
+    if i_window < 1 or i_window % 2 == 0:
+        raise ValueError('Smoothing window must be an odd number of pixels')
+
+
+def rolling(i_spectra, i_window):
+    """
+    Centered moving average along the pixels of every spectrum, edge pixels repeated. Same
+    kind of smoothing as the i_smooth argument of lc_measure.
+    :param i_spectra:  Array (spectra, pixels) or a single spectrum.
+    :param i_window:  Integer, odd number of pixels averaged.
+    :return:  Array (spectra, pixels).
+    """
+    _check_window(i_window)
+    spectra = np.atleast_2d(np.asarray(i_spectra, dtype=np.float64))
+    half = i_window // 2
+    padded = np.pad(spectra, ((0, 0), (half + 1, half)), mode='edge')
+    padded[:, 0] = 0.0
+    cumulative = np.cumsum(padded, axis=1)
+    return (cumulative[:, i_window:] - cumulative[:, :-i_window]) / i_window
+
+
+@functools.lru_cache(maxsize=None)
+def _savgol_coefficients(i_window, i_order):
+    """
+    :return:  Matrix (window, window), row j evaluates at pixel j of the window the
+    polynomial fitted to it.
+    """
+    half = i_window // 2
+    vandermonde = np.vander(np.arange(-half, half + 1, dtype=np.float64), i_order + 1, increasing=True)
+    return vandermonde @ np.linalg.pinv(vandermonde)
+
+
+def savgol(i_spectra, i_window, i_order=2):
+    """
+    Savitzky-Golay smoothing along the pixels of every spectrum. Pixels closer than half a
+    window to the ends take the value of the polynomial fitted to the first or last window.
+    :param i_spectra:  Array (spectra, pixels) or a single spectrum.
+    :param i_window:  Integer, odd number of pixels of the fitting window.
+    :param i_order:  Integer, polynomial order, lower than i_window.
+    :return:  Array (spectra, pixels).
+    """
+    _check_window(i_window)
+    if i_order >= i_window:
+        raise ValueError('Polynomial order must be lower than the window')
+    spectra = np.atleast_2d(np.asarray(i_spectra, dtype=np.float64))
+    pixels = spectra.shape[1]
+    if pixels < i_window:
+        raise ValueError('Spectra are shorter than the window')
+    half = i_window // 2
+    coefficients = _savgol_coefficients(i_window, i_order)
+    out = np.zeros_like(spectra)
+    interior = out[:, half:pixels - half]
+    term = np.empty_like(interior)
+    # One pass per window position, not per pixel.
+    for offset, coefficient in enumerate(coefficients[half]):
+        np.multiply(spectra[:, offset:pixels - i_window + 1 + offset], coefficient, out=term)
+        interior += term
+    out[:, :half] = spectra[:, :i_window] @ coefficients[:half].T
+    out[:, pixels - half:] = spectra[:, pixels - i_window:] @ coefficients[half + 1:].T
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def _baseline_basis(i_pixels, i_order):
+    vandermonde = np.vander(np.linspace(-1.0, 1.0, i_pixels), i_order + 1, increasing=True)
+    return vandermonde, np.linalg.pinv(vandermonde)
+
+
+def baseline(i_spectra, i_order=2, i_iterations=20):
+    """
+    Baseline of every spectrum by iterative polynomial fitting: the polynomial is fitted,
+    the spectrum is clipped to it and the fit repeated, so peaks drop out of the fit.
+    :param i_spectra:  Array (spectra, pixels) or a single spectrum.
+    :param i_order:  Integer, polynomial order of the baseline.
+    :param i_iterations:  Integer, number of fit and clip passes.
+    :return:  Array (spectra, pixels).
+    """
+    spectra = np.atleast_2d(np.asarray(i_spectra, dtype=np.float64))
+    vandermonde, inverse = _baseline_basis(spectra.shape[1], i_order)
+    work = spectra.copy()
+    fitted = work @ inverse.T @ vandermonde.T
+    for _ in range(i_iterations - 1):
+        np.minimum(work, fitted, out=work)
+        fitted = work @ inverse.T @ vandermonde.T
+    return fitted
+
+
+def remove_baseline(i_spectra, i_order=2, i_iterations=20):
+    """
+    :return:  i_spectra minus their baseline (see baseline).
+    """
+    spectra = np.atleast_2d(np.asarray(i_spectra, dtype=np.float64))
+    return spectra - baseline(spectra, i_order, i_iterations)
+
+
+def peaks(i_spectra, i_wavelength, i_chunk=4096):
+    """
+    Peak wavelength and FWHM of every spectrum, the same values as lc_measuredate items
+    13~18 of a live measurement.
+    :param i_spectra:  Array (spectra, pixels) or a single spectrum.
+    :param i_wavelength:  Wavelength grid in nm of the pixels.
+    :param i_chunk:  Number of spectra processed at once, bounds the temporary memory.
+    :return:  Dictionary item code -> array with one value per spectrum, empty arrays for
+    an empty batch.
+    """
+    spectra = np.atleast_2d(np.asarray(i_spectra, dtype=np.float64))
+    if len(spectra) == 0:
+        return {item: np.empty(0) for item in range(13, 19)}
+    parts = [peak(spectra[start:start + i_chunk], i_wavelength) for start in range(0, len(spectra), i_chunk)]
+    if len(parts) == 1:
+        return parts[0]
+    return {item: np.concatenate([part[item] for part in parts]) for item in parts[0]}
@@ -0,0 +1,379 @@
+import json
+import os
+import time
+
+import numpy as np
+
+
+DEFAULT_ITEMS = (*range(0, 22), *range(31, 47), *range(901, 906))
+DEFAULT_CHANNELS = ('spectrum',)
+
+_HEADER = 'header.json'
+_WAVELENGTH = 'wavelength.npy'
+_SPECTRA = 'spectra.dat'
+_TIMESTAMP = 'timestamp.dat'
+_SERIAL = 'serial.dat'
+# Sidecar index: (timestamp, record) sorted by timestamp, and runs of consecutive records
+# of one spectrometer as (serial code, first record, last record + 1).
+_TIME_INDEX = 'index_timestamp.dat'
+_SERIAL_INDEX = 'index_serial.dat'
+_TIME_DTYPE = np.dtype([('timestamp', np.float64), ('record', np.int64)])
+_RUN_DTYPE = np.dtype([('serial', np.int64), ('start', np.int64), ('stop', np.int64)])
+
+
+def _item_file(i_item):
+    return 'item_%d.dat' % i_item
+
+
+def _read_header(i_path):
+    with open(os.path.join(i_path, _HEADER)) as file:
+        return json.load(file)
+
+
+def _write_header(i_path, i_header):
+    temporary = os.path.join(i_path, _HEADER + '.tmp')
+    with open(temporary, 'w') as file:
+        json.dump(i_header, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, os.path.join(i_path, _HEADER))
+
+
+def _columns(i_header):
+    """
+    :return:  List of (file name, dtype, values per record) of every store file.
+    """
+    columns = [(_SPECTRA, np.float64, len(i_header['channels']) * i_header['pixels']),
+               (_TIMESTAMP, np.float64, 1), (_SERIAL, np.int32, 1)]
+    columns += [(_item_file(item), np.float64, 1) for item in i_header['items']]
+    return columns
+
+
+def _build_index(i_timestamp, i_serial):
+    """
+    :return:  Tuple (time index, serial runs) arrays of the columns.
+    """
+    order = np.argsort(i_timestamp, kind='stable')
+    times = np.empty(len(order), dtype=_TIME_DTYPE)
+    times['timestamp'] = i_timestamp[order]
+    times['record'] = order
+    starts = np.flatnonzero(np.diff(i_serial)) + 1 if len(i_serial) else np.empty(0, dtype=np.intp)
+    starts = np.concatenate(([0], starts)) if len(i_serial) else starts
+    runs = np.empty(len(starts), dtype=_RUN_DTYPE)
+    runs['serial'] = i_serial[starts]
+    runs['start'] = starts
+    runs['stop'] = np.append(starts[1:], len(i_serial))
+    return times, runs
+
+
+def _read_index(i_path, i_count):
+    """
+    :return:  Tuple (time index, serial runs) memory maps, None if the index files are missing
+    or do not cover exactly i_count records (crash, or records not flushed yet).
+    """
+    index = []
+    for name, dtype in ((_TIME_INDEX, _TIME_DTYPE), (_SERIAL_INDEX, _RUN_DTYPE)):
+        path = os.path.join(i_path, name)
+        if not os.path.exists(path):
+            return None
+        rows = os.path.getsize(path) // dtype.itemsize
+        index.append(np.memmap(path, dtype=dtype, mode='r', shape=(rows,)) if rows else np.empty(0, dtype=dtype))
+    times, runs = index
+    if len(times) != i_count:
+        return None
+    if i_count == 0:
+        return times, runs
+    if len(runs) == 0 or runs[0]['start'] != 0 or runs[-1]['stop'] != i_count:
+        return None
+    if len(runs) > 1 and np.any(runs['start'][1:] != runs['stop'][:-1]):
+        return None
+    return times, runs
+
+
+def _write_index(i_path, i_times, i_runs):
+    for name, rows in ((_TIME_INDEX, i_times), (_SERIAL_INDEX, i_runs)):
+        temporary = os.path.join(i_path, name + '.tmp')
+        rows.tofile(temporary)
+        os.replace(temporary, os.path.join(i_path, name))
+
+
+def _complete(i_path, i_header):
+    """
+    :return:  Number of records present in every store file.
+    """
+    count = None
+    for name, dtype, size in _columns(i_header):
+        path = os.path.join(i_path, name)
+        records = os.path.getsize(path) // (np.dtype(dtype).itemsize * size) if os.path.exists(path) else 0
+        count = records if count is None else min(count, records)
+    return count
+
+
+class Recorder:
+    """
+    Append-only binary store for measurements.
+    A store is a directory with a fixed-stride spectra file (records x channels x pixels
+    float64), one column file per scalar item plus timestamp and serial number, the common
+    wavelength grid (item 801) and a JSON header holding the layout and the serial number
+    table from lc_getlist.
+    Every file grows by exactly one record per append, so after a crash the store is
+    truncated to the last record present in all files when it is opened again.
+    A sidecar index is maintained on append: the (timestamp, record) pairs sorted by
+    timestamp and the runs of consecutive records per serial number. Records appended in
+    time order extend it, an earlier timestamp (clock set back) rebuilds the time index at
+    the next flush. An index not matching the records (crash) is rebuilt on open.
+    """
+    def __init__(self, i_path, i_pixels=None, i_wavelength=None, i_channels=DEFAULT_CHANNELS, i_items=DEFAULT_ITEMS,
+                 i_flush=64):
+        """
+        :param i_path:  String, store directory, created if missing, appended to otherwise.
+        :param i_pixels:  Integer, number of pixels, taken from the first record if None.
+        :param i_wavelength:  Wavelength array (item 801), taken from the first
+        MeasureResult if None.
+        :param i_channels:  Names of the spectra stored per record, e.g. ('spectrum', 'raw').
+        :param i_items:  Item codes stored as scalar columns.
+        :param i_flush:  Number of records after which the files are flushed.
+        """
+        self.path = i_path
+        self.flush_every = i_flush
+        self.pending = 0
+        self.files = None
+        self.index_files = None
+        os.makedirs(i_path, exist_ok=True)
+        if os.path.exists(os.path.join(i_path, _HEADER)):
+            self.header = _read_header(i_path)
+            self.count = self.recover()
+        else:
+            self.header = {'version': 1, 'pixels': i_pixels, 'channels': list(i_channels),
+                           'items': list(i_items), 'serials': [], 'ordered': True}
+            self.count = 0
+            _write_index(i_path, np.empty(0, dtype=_TIME_DTYPE), np.empty(0, dtype=_RUN_DTYPE))
+            self._index_state(np.empty(0, dtype=_TIME_DTYPE), np.empty(0, dtype=_RUN_DTYPE))
+            if i_pixels is not None:
+                _write_header(i_path, self.header)
+        self.serials = {serial: code for code, serial in enumerate(self.header['serials'])}
+        if i_wavelength is not None and not os.path.exists(os.path.join(i_path, _WAVELENGTH)):
+            np.save(os.path.join(i_path, _WAVELENGTH), np.asarray(i_wavelength, dtype=np.float64))
+
+    def recover(self):
+        """
+        Truncate all files to the last complete record and rebuild the index if it does not
+        match them.
+        :return:  Number of records in the store.
+        """
+        count = _complete(self.path, self.header)
+        for name, dtype, size in _columns(self.header):
+            path = os.path.join(self.path, name)
+            with open(path, 'ab') as file:
+                file.truncate(count * np.dtype(dtype).itemsize * size)
+        index = _read_index(self.path, count)
+        if index is None:
+            index = self._rebuild(count)
+        self._index_state(*index)
+        return count
+
+    def _rebuild(self, i_count):
+        timestamp = np.fromfile(os.path.join(self.path, _TIMESTAMP), dtype=np.float64, count=i_count)
+        serial = np.fromfile(os.path.join(self.path, _SERIAL), dtype=np.int32, count=i_count)
+        times, runs = _build_index(timestamp, serial)
+        _write_index(self.path, times, runs)
+        ordered = bool(np.all(np.diff(timestamp) >= 0))
+        if self.header.get('ordered') != ordered:
+            self.header['ordered'] = ordered
+            _write_header(self.path, self.header)
+        return times, runs
+
+    def _index_state(self, i_times, i_runs):
+        # Latest timestamp indexed, whether the time index must be rebuilt, and the current
+        # serial run with its row in the serial index file.
+        self.latest = float(i_times['timestamp'][-1]) if len(i_times) else -np.inf
+        self.reindex = False
+        self.run = [int(field) for field in i_runs[-1]] if len(i_runs) else None
+        self.run_row = len(i_runs) - 1
+
+    def _open(self, i_pixels):
+        if self.header['pixels'] is None:
+            self.header['pixels'] = i_pixels
+            _write_header(self.path, self.header)
+        self.files = [(open(os.path.join(self.path, name), 'ab'), dtype) for name, dtype, _ in _columns(self.header)]
+        self.index_files = (open(os.path.join(self.path, _TIME_INDEX), 'ab'),
+                            open(os.path.join(self.path, _SERIAL_INDEX), 'r+b'))
+
+    def _index(self, i_timestamp, i_serial):
+        record = self.count
+        if i_timestamp >= self.latest:
+            if not self.reindex:
+                self.index_files[0].write(np.array((i_timestamp, record), dtype=_TIME_DTYPE).tobytes())
+            self.latest = i_timestamp
+        else:
+            self.reindex = True
+            if self.header.get('ordered', True):
+                self.header['ordered'] = False
+                _write_header(self.path, self.header)
+        if self.run is not None and self.run[0] == i_serial:
+            self.run[2] = record + 1
+            return
+        if self.run is not None:
+            self._write_run()
+        self.run = [i_serial, record, record + 1]
+        self.run_row += 1
+
+    def _write_run(self):
+        file = self.index_files[1]
+        file.seek(self.run_row * _RUN_DTYPE.itemsize)
+        file.write(np.array(tuple(self.run), dtype=_RUN_DTYPE).tobytes())
+
+    def _serial(self, i_serialnumber):
+        code = self.serials.get(i_serialnumber)
+        if code is None:
+            code = self.serials[i_serialnumber] = len(self.header['serials'])
+            self.header['serials'].append(i_serialnumber)
+            _write_header(self.path, self.header)
+        return code
+
+    def append(self, i_serialnumber, i_spectra, i_values, i_timestamp=None):
+        """
+        :param i_serialnumber:  String, serial number of the spectrometer (lc_getlist).
+        :param i_spectra:  Array (channels, pixels), one row per channel.
+        :param i_values:  Dictionary item code -> value, missing items are stored as NaN.
+        :param i_timestamp:  Seconds since the epoch, time.time() if None.
+        """
+        spectra = np.asarray(i_spectra, dtype=np.float64)
+        if spectra.ndim == 1:
+            spectra = spectra[None]
+        if self.files is None:
+            self._open(spectra.shape[1])
+        if spectra.shape != (len(self.header['channels']), self.header['pixels']):
+            raise ValueError('Expected spectra of shape (%d, %d)' % (len(self.header['channels']),
+                                                                      self.header['pixels']))
+        timestamp = time.time() if i_timestamp is None else i_timestamp
+        serial = self._serial(i_serialnumber)
+        values = [spectra, timestamp, serial]
+        values += [i_values.get(item, np.nan) for item in self.header['items']]
+        for (file, dtype), value in zip(self.files, values):
+            file.write(np.asarray(value, dtype=dtype).tobytes())
+        self._index(timestamp, serial)
+        self.count += 1
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def append_result(self, i_serialnumber, i_result, i_raw=None, i_timestamp=None):
+        """
+        Append a MeasureResult (see lc_measuredateall). The 'spectrum' channel is item 802,
+        the 'raw' channel is i_raw (e.g. from lc_getspectrum_np).
+        """
+        if not os.path.exists(os.path.join(self.path, _WAVELENGTH)):
+            np.save(os.path.join(self.path, _WAVELENGTH), np.asarray(i_result.wavelength, dtype=np.float64))
+        channels = {'spectrum': i_result.spectrum, 'raw': i_raw}
+        spectra = [np.asarray(channels[channel], dtype=np.float64) for channel in self.header['channels']]
+        values = {item: float(i_result.item(item)) for item in self.header['items']}
+        self.append(i_serialnumber, spectra, values, i_timestamp)
+
+    def flush(self):
+        if self.files is not None:
+            for file, _ in self.files:
+                file.flush()
+            if self.run is not None:
+                self._write_run()
+            for file in self.index_files:
+                file.flush()
+            if self.reindex:
+                for file in self.index_files:
+                    file.close()
+                self._index_state(*self._rebuild(self.count))
+                self.index_files = (open(os.path.join(self.path, _TIME_INDEX), 'ab'),
+                                    open(os.path.join(self.path, _SERIAL_INDEX), 'r+b'))
+        self.pending = 0
+
+    def close(self):
+        if self.files is not None:
+            self.flush()
+            for file, _ in self.files:
+                file.close()
+            for file in self.index_files:
+                file.close()
+            self.files = None
+            self.index_files = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Reader:
+    """
+    Zero-copy access to a store written by Recorder. Spectra and item columns are read-only
+    memory maps, indexing and slicing them does not read the rest of the store. Time ranges
+    and serial numbers are looked up in the sidecar index, built in memory if it does not
+    match the records (store still written to, or opened after a crash).
+    """
+    def __init__(self, i_path):
+        """
+        :param i_path:  String, store directory.
+        """
+        self.path = i_path
+        self.header = _read_header(i_path)
+        self.count = _complete(i_path, self.header)
+        self.channels = self.header['channels']
+        self.serials = self.header['serials']
+        pixels = self.header['pixels']
+        wavelength = os.path.join(i_path, _WAVELENGTH)
+        self.wavelength = np.load(wavelength, mmap_mode='r') if os.path.exists(wavelength) else None
+        self.spectra = self._map(_SPECTRA, np.float64, (self.count, len(self.channels), pixels))
+        self.timestamp = self._map(_TIMESTAMP, np.float64, (self.count,))
+        self.serial = self._map(_SERIAL, np.int32, (self.count,))
+        self.items = {item: self._map(_item_file(item), np.float64, (self.count,)) for item in self.header['items']}
+        index = _read_index(i_path, self.count)
+        if index is None:
+            index = _build_index(np.asarray(self.timestamp), np.asarray(self.serial))
+            self.ordered = bool(np.all(np.diff(self.timestamp) >= 0))
+        else:
+            self.ordered = self.header.get('ordered', False)
+        self.times, self.runs = index
+
+    def _map(self, i_name, i_dtype, i_shape):
+        if i_shape[0] == 0:
+            return np.empty(i_shape, dtype=i_dtype)
+        return np.memmap(os.path.join(self.path, i_name), dtype=i_dtype, mode='r', shape=i_shape)
+
+    def __len__(self):
+        return self.count
+
+    def channel(self, i_name):
+        """
+        :return:  View (records, pixels) of one spectra channel.
+        """
+        return self.spectra[:, self.channels.index(i_name)]
+
+    def time_range(self, i_start, i_stop):
+        """
+        :return:  Slice (or index array if timestamps are not in order) of the records with
+        i_start <= timestamp < i_stop.
+        """
+        start, stop = np.searchsorted(self.times['timestamp'], (i_start, i_stop))
+        if self.ordered:
+            return slice(int(start), int(stop))
+        return np.sort(self.times['record'][start:stop])
+
+    def serial_records(self, i_serialnumber):
+        """
+        :return:  Index array of the records measured with the given spectrometer.
+        """
+        if i_serialnumber not in self.serials:
+            return np.empty(0, dtype=np.intp)
+        runs = self.runs[self.runs['serial'] == self.serials.index(i_serialnumber)]
+        if len(runs) == 0:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate([np.arange(start, stop) for start, stop in zip(runs['start'], runs['stop'])])
+
+    def record(self, i_index):
+        """
+        :return:  Dictionary of one record, spectra as views into the store.
+        """
+        record = {'timestamp': float(self.timestamp[i_index]), 'serialnumber': self.serials[self.serial[i_index]]}
+        record.update({channel: self.spectra[i_index, position] for position, channel in enumerate(self.channels)})
+        record.update({item: float(column[i_index]) for item, column in self.items.items()})
+        return record
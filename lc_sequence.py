@@ -0,0 +1,278 @@
+"""
+Declarative test sequences. A sequence is a dict, or YAML text or file with the same
+content, of device settings and a list of steps:
+
+    device: 0
+    license: LDA~G40090129_1.5.spt
+    calibration: Sp_LDA~G40090129.txt
+    zoom: 1.0
+    integration: 100
+    averaging: 5
+    steps:
+      - dark                                  # lc_oncedark, or {dark: {mode: auto}}
+      - autointegration: {saturation: 0.8}    # replaces integration and averaging
+      - measure: {darkmode: 1, smooth: 0}
+      - extract: {items: [cx, cy, 1]}
+      - limits: {cx: [0.30, 0.32], cct: [2700, null]}
+
+Every step but limits may override the settings (license, calibration, zoom, integration,
+averaging) for itself and the following steps. Before dark, autointegration and measure
+steps the device is configured with lc_activate, lc_readfbr, lc_setzoomfactor and
+lc_setintegration, but only for settings differing from the shadow state of the device,
+the settings last applied to it. The shadow state is shared by all runners, calls made outside of them
+(or lc_init/lc_done) must be followed by invalidate().
+"""
+import os
+import threading
+import time
+
+from Py_LcSpvis import BlockingFunctions, MEASUREDATE_ITEMS
+
+
+STEPS = ('dark', 'autointegration', 'measure', 'extract', 'limits')
+SETTINGS = ('license', 'calibration', 'zoom', 'integration', 'averaging')
+
+_CODES = {name: code for code, name in MEASUREDATE_ITEMS.items()}
+
+
+class DeviceState:
+    """
+    Settings last applied to a device, None if unknown.
+    """
+    __slots__ = ('license', 'calibration', 'zoom', 'integration')
+
+    def __init__(self):
+        self.license = None
+        # (path, modification time) of the calibration file read with lc_readfbr.
+        self.calibration = None
+        self.zoom = None
+        # (integration, averaging) set with lc_setintegration.
+        self.integration = None
+
+
+# Shadow state per device index.
+_STATES = {}
+_STATES_LOCK = threading.Lock()
+
+
+def device_state(i_index):
+    with _STATES_LOCK:
+        state = _STATES.get(i_index)
+        if state is None:
+            state = _STATES[i_index] = DeviceState()
+        return state
+
+
+def invalidate(i_index=None):
+    """
+    Forget the shadow state of one device or of all of them, the next configuration
+    calls are made again.
+    """
+    with _STATES_LOCK:
+        if i_index is None:
+            _STATES.clear()
+        else:
+            _STATES.pop(i_index, None)
+
+
+def load(i_source):
+    """
+    :param i_source:  Dict, YAML text or path of a YAML file.
+    :return:  Sequence dict.
+    """
+    if isinstance(i_source, dict):
+        return i_source
+    import yaml
+    if os.path.exists(i_source):
+        with open(i_source) as file:
+            return yaml.safe_load(file)
+    return yaml.safe_load(i_source)
+
+
+def _code(i_item):
+    """
+    :return:  lc_measuredate item code of a code or MEASUREDATE_ITEMS name.
+    """
+    return _CODES[i_item] if isinstance(i_item, str) else int(i_item)
+
+
+def _parse_step(i_step):
+    if isinstance(i_step, str):
+        kind, parameters = i_step, {}
+    else:
+        (kind, parameters), = i_step.items()
+        parameters = dict(parameters or {})
+    if kind not in STEPS:
+        raise ValueError('Unknown sequence step %r' % (kind,))
+    return kind, parameters
+
+
+class SequenceRunner:
+    """
+    Runs a sequence (see the module docstring) and reports the configuration calls avoided
+    by the shadow state. The time saved is estimated from the mean duration of the same
+    calls made by this runner.
+    """
+    def __init__(self, i_sequence, i_darkcache=None):
+        """
+        :param i_sequence:  Dict, YAML text or path of a YAML file.
+        :param i_darkcache:  Optional lc_dark.DarkCache, dark steps in 'once' mode then
+        capture a dark only when the cached one is missing or stale.
+        """
+        sequence = load(i_sequence)
+        self.index = sequence.get('device', 0)
+        self.settings = {key: sequence[key] for key in SETTINGS if key in sequence}
+        self.steps = [_parse_step(step) for step in sequence.get('steps', ())]
+        self.darkcache = i_darkcache
+        # Function name -> (calls, seconds) of the calls made.
+        self.costs = {}
+        self.runs = 0
+        self.total_calls = 0
+        self.total_avoided = 0
+        self.total_saved = 0.0
+
+    def _call(self, i_report, i_name, *args):
+        start = time.perf_counter()
+        result = getattr(BlockingFunctions, i_name)(*args)
+        calls, seconds = self.costs.get(i_name, (0, 0.0))
+        self.costs[i_name] = (calls + 1, seconds + time.perf_counter() - start)
+        i_report['calls'] += 1
+        return result
+
+    def _avoid(self, i_report, i_name):
+        avoided = i_report['avoided']
+        avoided[i_name] = avoided.get(i_name, 0) + 1
+        calls, seconds = self.costs.get(i_name, (0, 0.0))
+        if calls:
+            i_report['saved'] += seconds / calls
+
+    def _configure(self, i_report, i_index, i_settings):
+        """
+        Apply the settings differing from the shadow state.
+        :return:  Return code of the first failing call, 0 otherwise.
+        """
+        state = device_state(i_index)
+        license = i_settings.get('license')
+        if license is not None:
+            if state.license == license:
+                self._avoid(i_report, 'lc_activate')
+            else:
+                ret = self._call(i_report, 'lc_activate', i_index, license)
+                if ret != 0:
+                    return ret
+                state.license = license
+        calibration = i_settings.get('calibration')
+        if calibration is not None:
+            key = (calibration, os.path.getmtime(calibration) if os.path.exists(calibration) else None)
+            if state.calibration == key:
+                self._avoid(i_report, 'lc_readfbr')
+            else:
+                ret = self._call(i_report, 'lc_readfbr', i_index, calibration)
+                if ret != 0:
+                    state.calibration = None
+                    return ret
+                state.calibration = key
+        zoom = i_settings.get('zoom')
+        if zoom is not None:
+            if state.zoom == zoom:
+                self._avoid(i_report, 'lc_setzoomfactor')
+            else:
+                ret = self._call(i_report, 'lc_setzoomfactor', i_index, zoom)
+                if ret != 0:
+                    return ret
+                state.zoom = zoom
+        if 'integration' in i_settings:
+            integration = (i_settings['integration'], i_settings.get('averaging', 1))
+            if state.integration == integration:
+                self._avoid(i_report, 'lc_setintegration')
+            else:
+                ret = self._call(i_report, 'lc_setintegration', i_index, *integration)
+                if ret != 0:
+                    state.integration = None
+                    return ret
+                state.integration = integration
+        return 0
+
+    def _step(self, i_report, i_index, i_settings, i_kind, i_parameters):
+        """
+        :return:  Return code of the step.
+        """
+        if i_kind in ('dark', 'autointegration', 'measure'):
+            ret = self._configure(i_report, i_index, i_settings)
+            if ret != 0:
+                return ret
+        integration = i_settings.get('integration', 100.0)
+        averaging = i_settings.get('averaging', 1)
+        if i_kind == 'dark':
+            if i_parameters.get('mode', 'once') == 'auto':
+                return self._call(i_report, 'lc_autodark', i_index, integration)
+            if self.darkcache is None:
+                return self._call(i_report, 'lc_oncedark', i_index, integration, averaging)
+            hits = self.darkcache.hits
+            start = time.perf_counter()
+            ret = self.darkcache.ensure(i_index, integration, averaging)
+            if self.darkcache.hits > hits:
+                self._avoid(i_report, 'lc_oncedark')
+            else:
+                calls, seconds = self.costs.get('lc_oncedark', (0, 0.0))
+                self.costs['lc_oncedark'] = (calls + 1, seconds + time.perf_counter() - start)
+                i_report['calls'] += 1
+            return ret
+        if i_kind == 'autointegration':
+            ret, integration, averaging = self._call(i_report, 'lc_autointegration', i_index,
+                                                     i_parameters.get('saturation', 0.8), 0.0, 0)
+            if ret == 0:
+                i_settings['integration'], i_settings['averaging'] = integration, averaging
+            return ret
+        if i_kind == 'measure':
+            return self._call(i_report, 'lc_measure', i_index, integration, averaging,
+                              i_parameters.get('darkmode', 1), i_parameters.get('aux', False),
+                              i_parameters.get('smooth', 0))
+        if i_kind == 'extract':
+            items = [_code(item) for item in i_parameters.get('items', MEASUREDATE_ITEMS)]
+            ret, values = self._call(i_report, 'lc_measuredateall', i_index, items)
+            if ret == 0:
+                i_report['values'].update({MEASUREDATE_ITEMS[code]: value for code, value in values.items()})
+            return ret
+        for item, (low, high) in i_parameters.items():
+            name = MEASUREDATE_ITEMS[_code(item)]
+            value = i_report['values'].get(name)
+            passed = (value is not None and (low is None or value >= low) and (high is None or value <= high))
+            i_report['limits'][name] = (value, passed)
+            i_report['passed'] = i_report['passed'] and passed
+        return 0
+
+    def run(self, i_index=None):
+        """
+        :param i_index:  Integer, device index, the sequence's device if None.
+        :return:  Dictionary report: passed (all limits met and no error), error (return
+        code), step (position of the failing step or None), values (item name -> value),
+        limits (item name -> (value, passed)), calls (library calls made), avoided
+        (function name -> calls skipped), saved (estimated seconds) and elapsed.
+        """
+        index = self.index if i_index is None else i_index
+        settings = dict(self.settings)
+        report = {'passed': True, 'error': 0, 'step': None, 'values': {}, 'limits': {}, 'calls': 0,
+                  'avoided': {}, 'saved': 0.0}
+        start = time.perf_counter()
+        for position, (kind, parameters) in enumerate(self.steps):
+            if kind != 'limits':
+                settings.update({key: parameters[key] for key in SETTINGS if key in parameters})
+            ret = self._step(report, index, settings, kind, parameters)
+            if ret != 0:
+                report.update(passed=False, error=ret, step=position)
+                break
+        report['elapsed'] = time.perf_counter() - start
+        self.runs += 1
+        self.total_calls += report['calls']
+        self.total_avoided += sum(report['avoided'].values())
+        self.total_saved += report['saved']
+        return report
+
+    def statistics(self):
+        """
+        :return:  Dictionary with the number of runs, library calls made and avoided, and
+        the estimated seconds saved.
+        """
+        return {'runs': self.runs, 'calls': self.total_calls, 'avoided': self.total_avoided,
+                'saved': self.total_saved}
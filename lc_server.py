@@ -0,0 +1,443 @@
+"""
+Local acquisition server. One long-running process owns the library and all spectrometers,
+client processes call BlockingFunctions through it over a Unix socket:
+
+    python lc_server.py --path library                      # the .net library
+    python lc_server.py --backend simulator --devices 2     # no hardware
+
+    functions = lc_server.Client()
+    functions.lc_measure(0, 100, 5, 1, False, 0)
+    ret, result = functions.lc_measuredateall(0)
+
+Requests and scalar results are pickled, arrays (spectra, wavelengths) are written into a
+shared-memory ring created per connection and only their position is sent. Array results
+are views into that ring, valid until the ring wraps (i_slots further arrays on the same
+connection), copy them to keep them longer.
+Requests for one device are executed in order by a worker thread per device index, which
+serves the connections waiting for the device round-robin, one request each, so a client
+sending many requests cannot starve the others.
+The socket is created with owner-only permissions, pickled requests are trusted, do not
+expose it to other users.
+"""
+import argparse
+import collections
+import inspect
+import os
+import pickle
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import Py_LcSpvis
+from Py_LcSpvis import BlockingFunctions, MeasureResult, _copy_array
+
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'lcspvis.sock')
+
+# Functions handled by the server itself instead of a device worker. The devices stay
+# initialized while the server runs, so lc_init returns the device count of the server and
+# lc_done/lc_doneall of a client do not release devices other clients are using.
+_LOCAL = ('lc_init', 'lc_done', 'lc_doneall')
+
+_LENGTH = struct.Struct('!I')
+
+# BlockingFunctions signatures the client binds arguments to, name -> inspect.Signature.
+_SIGNATURES = {}
+
+
+class _Shared:
+    """
+    Position of an array in the shared-memory ring of the connection.
+    """
+    __slots__ = ('offset', 'size')
+
+    def __init__(self, i_offset, i_size):
+        self.offset = i_offset
+        self.size = i_size
+
+    def __getstate__(self):
+        return self.offset, self.size
+
+    def __setstate__(self, i_state):
+        self.offset, self.size = i_state
+
+
+def _send(i_socket, i_value):
+    data = pickle.dumps(i_value, pickle.HIGHEST_PROTOCOL)
+    i_socket.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def _receive_exactly(i_socket, i_size):
+    data = bytearray(i_size)
+    view = memoryview(data)
+    while i_size:
+        received = i_socket.recv_into(view[-i_size:], i_size)
+        if not received:
+            raise ConnectionError('Connection closed')
+        i_size -= received
+    return data
+
+
+def _receive(i_socket):
+    size, = _LENGTH.unpack(_receive_exactly(i_socket, _LENGTH.size))
+    return pickle.loads(_receive_exactly(i_socket, size))
+
+
+def _is_array(i_value):
+    return isinstance(i_value, np.ndarray) or hasattr(i_value, 'Length')
+
+
+class _Connection:
+    def __init__(self, i_socket, i_slots, i_slotsize):
+        self.socket = i_socket
+        self.slots = i_slots
+        self.slotsize = i_slotsize
+        self.slot = 0
+        self.ring = shared_memory.SharedMemory(create=True, size=i_slots * i_slotsize)
+        self.lock = threading.Lock()
+
+    def _share(self, i_array):
+        size = len(i_array)
+        if size * 8 > self.slotsize:
+            # Larger than a ring slot, sent pickled.
+            return _copy_array(i_array, np.empty(size, dtype=np.float64))
+        offset = self.slot * self.slotsize
+        self.slot = (self.slot + 1) % self.slots
+        _copy_array(i_array, np.ndarray(size, dtype=np.float64, buffer=self.ring.buf, offset=offset))
+        return _Shared(offset, size)
+
+    def pack(self, i_value):
+        """
+        :return:  i_value with its arrays moved to the ring.
+        """
+        if isinstance(i_value, tuple):
+            return tuple(self.pack(value) for value in i_value)
+        if isinstance(i_value, dict):
+            return {key: self.pack(value) for key, value in i_value.items()}
+        if isinstance(i_value, MeasureResult):
+            result = MeasureResult.__new__(MeasureResult)
+            for name in MeasureResult.__slots__:
+                setattr(result, name, self.pack(getattr(i_value, name)))
+            return result
+        if _is_array(i_value):
+            return self._share(i_value)
+        return i_value
+
+    def reply(self, i_value):
+        """
+        Send a result. A result that can not be sent (not picklable) is replaced by a
+        RuntimeError with its description, a closed connection is ignored.
+        """
+        with self.lock:
+            if self.ring is None:
+                return
+            try:
+                _send(self.socket, self.pack(i_value))
+            except OSError:
+                pass
+            except Exception as error:
+                try:
+                    _send(self.socket, RuntimeError(repr(error)))
+                except OSError:
+                    pass
+
+    def close(self):
+        with self.lock:
+            if self.ring is None:
+                return
+            self.socket.close()
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+
+
+class _Device:
+    """
+    Request queues of one device index, one per connection, served round-robin.
+    """
+    def __init__(self, i_index):
+        self.index = i_index
+        self.queues = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.requests = 0
+        thread = threading.Thread(target=self._work, name='LcSpvis-server-%d' % i_index, daemon=True)
+        thread.start()
+
+    def submit(self, i_connection, i_name, i_args):
+        with self.condition:
+            self.queues.setdefault(i_connection, collections.deque()).append((i_name, i_args))
+            self.condition.notify()
+
+    def _next(self):
+        with self.condition:
+            while not self.queues:
+                self.condition.wait()
+            connection, queue = next(iter(self.queues.items()))
+            name, args = queue.popleft()
+            if queue:
+                self.queues.move_to_end(connection)
+            else:
+                del self.queues[connection]
+            return connection, name, args
+
+    def _work(self):
+        # Nothing may end the loop, the requests queued for the device would never be served.
+        while True:
+            connection, name, args = self._next()
+            try:
+                result = getattr(BlockingFunctions, name)(*args)
+            except Exception as error:
+                result = error
+            self.requests += 1
+            try:
+                connection.reply(result)
+            except Exception as error:
+                connection.reply(RuntimeError(repr(error)))
+
+
+class Server:
+    """
+    Owner of the library and the devices, serving BlockingFunctions calls to Client
+    processes.
+    """
+    def __init__(self, i_path=DEFAULT_SOCKET, i_slots=8, i_pixels=None):
+        """
+        :param i_path:  String, Unix socket path.
+        :param i_slots:  Integer, arrays in the shared-memory ring of each connection.
+        :param i_pixels:  Integer, float64 elements per ring slot. The largest pixel count
+        of the connected devices (lc_getparameters) if None.
+        """
+        self.path = i_path
+        self.slots = i_slots
+        self.pixels = i_pixels
+        self.devices = {}
+        self.devices_lock = threading.Lock()
+        self.connections = set()
+        self.listener = None
+        self.count = None
+
+    def start(self):
+        """
+        Initialize the library (the backend selected with use_backend or
+        BlockingFunctions.__init__) and start accepting connections.
+        :return:  lc_init return value.
+        """
+        self.count = BlockingFunctions.lc_init()
+        if self.pixels is None:
+            pixels = [BlockingFunctions.lc_getparameters(index, 1, '') for index in range(max(self.count, 0))]
+            self.pixels = max([int(float(value)) for ret, value in pixels if ret == 0] or [4096])
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.listener.listen()
+        threading.Thread(target=self._accept, name='LcSpvis-server', daemon=True).start()
+        return self.count
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _device(self, i_index):
+        with self.devices_lock:
+            device = self.devices.get(i_index)
+            if device is None:
+                device = self.devices[i_index] = _Device(i_index)
+            return device
+
+    def _serve(self, i_socket):
+        connection = _Connection(i_socket, self.slots, self.pixels * 8)
+        self.connections.add(connection)
+        try:
+            _send(i_socket, (connection.ring.name, connection.ring.size, os.getpid()))
+            while True:
+                name, args = _receive(i_socket)
+                if name == 'lc_init':
+                    connection.reply(self.count)
+                elif name in _LOCAL:
+                    connection.reply(0)
+                elif not hasattr(BlockingFunctions, name) or not args:
+                    connection.reply(AttributeError(name))
+                else:
+                    self._device(args[0]).submit(connection, name, args)
+        except (ConnectionError, OSError, EOFError):
+            pass
+        finally:
+            # Closed before it is dropped from connections, stop() closes it otherwise.
+            connection.close()
+            self.connections.discard(connection)
+
+    def statistics(self):
+        """
+        :return:  Dictionary device index -> number of executed requests, and the number
+        of open connections ('connections').
+        """
+        report = {index: device.requests for index, device in self.devices.items()}
+        report['connections'] = len(self.connections)
+        return report
+
+    def stop(self):
+        """
+        Stop accepting connections and release the devices.
+        """
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            for connection in list(self.connections):
+                connection.close()
+            BlockingFunctions.lc_doneall()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class _ClientConnection:
+    def __init__(self, i_path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(i_path)
+        name, size, process = _receive(self.socket)
+        self.ring = shared_memory.SharedMemory(name=name)
+        # The server owns the ring, keep the resource tracker of this process from
+        # unlinking it at exit. A server in this process tracks it itself.
+        if process != os.getpid():
+            resource_tracker.unregister(self.ring._name, 'shared_memory')
+
+    def unpack(self, i_value):
+        if isinstance(i_value, _Shared):
+            return np.ndarray(i_value.size, dtype=np.float64, buffer=self.ring.buf, offset=i_value.offset)
+        if isinstance(i_value, tuple):
+            return tuple(self.unpack(value) for value in i_value)
+        if isinstance(i_value, dict):
+            return {key: self.unpack(value) for key, value in i_value.items()}
+        if isinstance(i_value, MeasureResult):
+            for name in MeasureResult.__slots__:
+                setattr(i_value, name, self.unpack(getattr(i_value, name)))
+        return i_value
+
+    def call(self, i_name, i_args):
+        _send(self.socket, (i_name, i_args))
+        result = _receive(self.socket)
+        if isinstance(result, Exception):
+            raise result
+        return self.unpack(result)
+
+    def close(self):
+        self.socket.close()
+        self.ring.close()
+
+
+class Client:
+    """
+    BlockingFunctions of a Server: client.lc_measure(0, 100, 5, 1, False, 0) takes the same
+    arguments and returns the same values as BlockingFunctions.lc_measure, arrays as NumPy
+    views into the shared-memory ring. The i_out argument of lc_getspectrum_np and
+    lc_measuredate_np is filled from the ring and returned instead.
+    Every thread uses its own connection (and ring), so a Client can be shared by threads.
+    """
+    def __init__(self, i_path=DEFAULT_SOCKET):
+        """
+        :param i_path:  String, Unix socket path of the server.
+        """
+        self.path = i_path
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = _ClientConnection(self.path)
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def call(self, i_name, *args, **kwargs):
+        """
+        Call BlockingFunctions.i_name(*args, **kwargs) in the server. The arguments are bound
+        to the signature of the function and sent by position, i_out is filled by the client
+        and never sent.
+        """
+        signature = _SIGNATURES.get(i_name)
+        if signature is None:
+            signature = _SIGNATURES[i_name] = inspect.signature(getattr(BlockingFunctions, i_name))
+        arguments = signature.bind(*args, **kwargs).arguments
+        out = arguments.pop('i_out', None)
+        result = self._connection().call(i_name, tuple(arguments.values()))
+        if out is None or result[1] is None:
+            return result
+        return result[0], _copy_array(result[1], out)
+
+    def __getattr__(self, i_name):
+        if not (i_name.startswith('lc_') or i_name == 'checkcaserror') or not hasattr(BlockingFunctions, i_name):
+            raise AttributeError(i_name)
+        function = getattr(BlockingFunctions, i_name)
+
+        def call(*args, **kwargs):
+            return self.call(i_name, *args, **kwargs)
+        call.__name__ = i_name
+        call.__doc__ = function.__doc__
+        return call
+
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections.clear()
+        self.local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main(i_arguments=None):
+    parser = argparse.ArgumentParser(description='Py_LcSpvis acquisition server')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--backend', choices=('simulator', 'clr'), default='clr')
+    parser.add_argument('--path', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'library'))
+    parser.add_argument('--devices', type=int, default=1, help='simulated devices')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated interop latency in us')
+    parser.add_argument('--slots', type=int, default=8, help='arrays in the ring of each connection')
+    arguments = parser.parse_args(i_arguments)
+
+    if arguments.backend == 'clr':
+        BlockingFunctions.__init__(Py_LcSpvis, arguments.path)
+    else:
+        import lc_simulator
+        Py_LcSpvis.use_backend(lc_simulator.Simulator(i_devices=arguments.devices,
+                                                      i_latency=arguments.latency * 1e-6))
+    server = Server(arguments.socket, arguments.slots)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    print('Devices: %d, listening on %s' % (server.start(), arguments.socket), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    # Run from the imported module, pickled _Shared markers refer to lc_server then.
+    import lc_server
+    sys.exit(lc_server.main())
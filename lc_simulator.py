@@ -0,0 +1,414 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+import lc_colorimetry
+
+
+ERR_SUCCESS = 0
+ERR_INVALID_PARAMETER = -1
+ERR_INVALID_ACTIVATE = -2
+ERR_INVALID_INT_TIME = -11
+ERR_INVALID_AVERAGING = -12
+ERR_INVALID_SATURATION = -13
+ERR_INVALID_ARRAY = -14
+ERR_INDEX_EXCEED_LIMIT = -19
+ERR_INVALID_AUTO_INT = -22
+ERR_FILE_NO_EXIST = -24
+
+
+def _busy_wait(i_seconds):
+    end = time.perf_counter() + i_seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class StdSpectralData:
+    """
+    Stand-in for LcSpvis.StdSpectralData.
+    """
+    def __init__(self):
+        for name in ('d_TotalPower', 'd_Intensity', 'd_X', 'd_Y', 'd_Z', 'd_Cx', 'd_Cy', 'd_U', 'd_V', 'd_Uc',
+                     'd_Vc', 'd_CCT', 'd_Ds', 'd_PeakWave', 'd_PeakHalf', 'd_PeakCount', 'd_PeakPix',
+                     'd_PeakPixWave', 'd_PeakPixCount', 'd_HasDominant', 'd_Dominant', 'd_Pure', 'd_Ra',
+                     'd_IntegrationTime', 'd_Averaging', 'd_Saturation', 'd_CostTime', 'd_UsageMode'):
+            setattr(self, name, 0.0)
+        self.d_CRI = np.zeros(15)
+        self.d_Wavelengths = np.zeros(0)
+        self.d_Spectrums = np.zeros(0)
+        self.d_Date = ''
+
+
+# Item code -> StdSpectralData property, R1~R15 go to d_CRI.
+_DATA_FIELDS = {
+    0: 'd_TotalPower', 1: 'd_Intensity', 2: 'd_X', 3: 'd_Y', 4: 'd_Z', 5: 'd_Cx', 6: 'd_Cy', 7: 'd_U', 8: 'd_V',
+    9: 'd_Uc', 10: 'd_Vc', 11: 'd_CCT', 12: 'd_Ds', 13: 'd_PeakWave', 14: 'd_PeakHalf', 15: 'd_PeakCount',
+    16: 'd_PeakPix', 17: 'd_PeakPixWave', 18: 'd_PeakPixCount', 19: 'd_HasDominant', 20: 'd_Dominant',
+    21: 'd_Pure', 31: 'd_Ra', 801: 'd_Wavelengths', 802: 'd_Spectrums', 901: 'd_IntegrationTime',
+    902: 'd_Averaging', 903: 'd_Saturation', 904: 'd_CostTime', 905: 'd_UsageMode',
+}
+
+
+class _Device:
+    def __init__(self, i_index, i_seed, i_activated):
+        self.serialnumber = 'SIM%05d' % i_index
+        self.rng = np.random.default_rng(i_seed + i_index)
+        self.lock = threading.Lock()
+        self.activated = i_activated
+        self.integration = 100.0
+        self.averaging = 1
+        self.maxintegration = 5000.0
+        self.maxaveraging = 100
+        self.zoom = 1.0
+        self.xyz_factor = np.ones(3)
+        self.dark = None
+        self.factor = None
+        self.result = None
+
+
+class Simulator:
+    """
+    Deterministic backend with the methods of LcSpvis.LC_SpFunc_XS, for development and
+    benchmarks without hardware or .net runtime (see Py_LcSpvis.use_backend).
+    The light source is a blackbody seen through a Gaussian detector response. The
+    saturation grows linearly with the integration time (offset + brightness x ms) and every
+    frame gets Gaussian noise from a seeded generator per device. Integration sleeps for
+    integration x averaging x timescale milliseconds (releasing the GIL like the library),
+    and every call costs latency seconds of simulated interop overhead.
+    Saturation values are fractions of the full scale.
+    """
+    StdSpectralData = StdSpectralData
+
+    def __init__(self, i_devices=1, i_pixels=2048, i_wavelength=(340.0, 1000.0), i_latency=0.0, i_noise=1e-3,
+                 i_timescale=1.0, i_temperature=3000.0, i_brightness=0.04, i_offset=0.02, i_fullscale=65535.0,
+                 i_seed=0, i_activated=True):
+        """
+        :param i_devices:  Integer, number of devices reported by LC_Init.
+        :param i_pixels:  Integer, number of pixels.
+        :param i_wavelength:  (first, last) wavelength in nm.
+        :param i_latency:  Double, seconds of interop overhead per call.
+        :param i_noise:  Double, standard deviation of the frame noise relative to full scale.
+        :param i_timescale:  Double, factor applied to the integration sleeps.
+        :param i_temperature:  Double, colour temperature of the simulated light source.
+        :param i_brightness:  Double, saturation per ms of integration.
+        :param i_offset:  Double, dark level as a fraction of full scale.
+        :param i_fullscale:  Double, counts at saturation.
+        :param i_seed:  Integer, noise seed.
+        :param i_activated:  Boolean, whether devices are usable without LC_Activate.
+        """
+        self.devices = i_devices
+        self.pixels = i_pixels
+        self.latency = i_latency
+        self.noise = i_noise
+        self.timescale = i_timescale
+        self.brightness = i_brightness
+        self.offset = i_offset
+        self.fullscale = i_fullscale
+        self.seed = i_seed
+        self.activated = i_activated
+        self.wavelength = np.linspace(i_wavelength[0], i_wavelength[1], i_pixels)
+        response = np.exp(-0.5 * ((self.wavelength - 600.0) / 200.0) ** 2)
+        shape = lc_colorimetry.planck(self.wavelength, i_temperature)[0] * response
+        self.shape = shape / shape.max()
+        self.engine = lc_colorimetry.get_engine(self.wavelength)
+        self.initialized = []
+
+    # Helpers
+
+    def _device(self, i_index, i_activated=True):
+        _busy_wait(self.latency)
+        if not 0 <= i_index < len(self.initialized):
+            return None, ERR_INDEX_EXCEED_LIMIT
+        device = self.initialized[i_index]
+        if device is None:
+            return None, ERR_INDEX_EXCEED_LIMIT
+        if i_activated and not device.activated:
+            return None, ERR_INVALID_ACTIVATE
+        return device, ERR_SUCCESS
+
+    def _integrate(self, i_integration, i_averaging):
+        duration = i_integration * i_averaging * self.timescale / 1000
+        if duration > 0:
+            time.sleep(duration)
+
+    def _saturation(self, i_integration):
+        return min(1.0, self.offset + self.brightness * i_integration)
+
+    def _noise(self, i_device, i_averaging):
+        with i_device.lock:
+            return i_device.rng.normal(0.0, self.noise * self.fullscale / np.sqrt(i_averaging), self.pixels)
+
+    def _frame(self, i_device, i_integration, i_averaging, i_darkmode):
+        """
+        :return:  Counts of one (averaged) frame with the selected dark subtraction, or None
+        for an invalid dark mode.
+        """
+        light = self.fullscale * (self.offset + self.brightness * i_integration * self.shape)
+        counts = np.minimum(light + self._noise(i_device, i_averaging), self.fullscale)
+        if i_darkmode == 0:
+            return counts
+        if i_darkmode == 1:
+            return counts - self.fullscale * self.offset
+        if i_darkmode == 2:
+            return counts - (self.fullscale * self.offset if i_device.dark is None else i_device.dark)
+        return None
+
+    def _valid(self, i_integration, i_averaging):
+        if not 0 < i_integration <= 60000:
+            return ERR_INVALID_INT_TIME
+        if not 1 <= i_averaging <= 10000:
+            return ERR_INVALID_AVERAGING
+        return ERR_SUCCESS
+
+    # Device handling
+
+    def LC_Init(self):
+        _busy_wait(self.latency)
+        self.initialized = [_Device(index, self.seed, self.activated) for index in range(self.devices)]
+        return self.devices
+
+    def LC_Done(self, i_index):
+        device, ret = self._device(i_index, False)
+        if device is not None:
+            self.initialized[i_index] = None
+        return ret
+
+    def LC_DoneAll(self):
+        _busy_wait(self.latency)
+        self.initialized = []
+        return ERR_SUCCESS
+
+    def LC_Activate(self, i_index, i_file):
+        device, ret = self._device(i_index, False)
+        if device is None:
+            return ret
+        if not os.path.exists(i_file):
+            return ERR_FILE_NO_EXIST
+        device.activated = True
+        return ERR_SUCCESS
+
+    def LC_GetList(self, i_index, i_serialnumber):
+        device, ret = self._device(i_index, False)
+        return ret, device.serialnumber if device is not None else i_serialnumber
+
+    def LC_GetParameters(self, i_index, i_mpiparametersno, i_parameters):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret, i_parameters
+        values = ['Simulator', self.pixels, self.wavelength[0], self.wavelength[-1]]
+        if not 0 <= i_mpiparametersno < len(values):
+            return ERR_INVALID_PARAMETER, i_parameters
+        if isinstance(i_parameters, str):
+            return ERR_SUCCESS, str(values[i_mpiparametersno])
+        return ERR_SUCCESS, np.array([values[i_mpiparametersno]] if i_mpiparametersno else [0.0], dtype=np.float64)
+
+    def CheckCASError(self, i_index, i_errorinformation):
+        device, ret = self._device(i_index, False)
+        return ret, ''
+
+    def LC_Shutter(self, i_index, i_trueisopen):
+        return self._device(i_index)[1]
+
+    # Dark and integration
+
+    def LC_AutoDark(self, i_index, i_integration):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        if not 0 < i_integration <= 60000:
+            return ERR_INVALID_INT_TIME
+        self._integrate(i_integration, 1)
+        return ERR_SUCCESS
+
+    def LC_OnceDark(self, i_index, i_integration, i_averaging):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        self._integrate(i_integration, i_averaging)
+        device.dark = self.fullscale * self.offset + self._noise(device, i_averaging)
+        return ERR_SUCCESS
+
+    def LC_DarkCompensation(self, i_index, i_usagemode, i_integration=1000):
+        return self._device(i_index)[1]
+
+    def LC_SetIntegration(self, i_index, i_integration, i_averaging):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        ret = self._valid(i_integration, i_averaging)
+        if ret == ERR_SUCCESS:
+            device.integration, device.averaging = i_integration, i_averaging
+        return ret
+
+    def LC_SetAutoMaxIntegration(self, i_index, i_maxintegration, i_maxaveraging):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret, i_maxintegration, i_maxaveraging
+        device.maxintegration, device.maxaveraging = i_maxintegration, i_maxaveraging
+        return ret, i_maxintegration, i_maxaveraging
+
+    def LC_GetSaturation(self, i_index, i_integration, i_averaging, i_saturation):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret, i_saturation
+        self._integrate(i_integration, i_averaging)
+        return ERR_SUCCESS, self._saturation(i_integration)
+
+    def LC_AutoIntegration(self, i_index, i_saturation, i_integration, i_averaging, *args):
+        """
+        Doubling followed by bisection on the saturation, a stand-in for the vendor search.
+        """
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret, i_integration, i_averaging
+        if not 0 < i_saturation < 1:
+            return ERR_INVALID_SATURATION, i_integration, i_averaging
+        low, high = 0.0, 1.0
+        while self._saturation(high) < i_saturation:
+            if high >= device.maxintegration:
+                return ERR_INVALID_AUTO_INT, i_integration, i_averaging
+            self._integrate(high, 1)
+            low, high = high, min(high * 2, device.maxintegration)
+        for _ in range(12):
+            middle = (low + high) / 2
+            self._integrate(middle, 1)
+            low, high = (middle, high) if self._saturation(middle) < i_saturation else (low, middle)
+        return ERR_SUCCESS, high, 1
+
+    LC_AutoIntegrationSTD = LC_AutoIntegration
+
+    # Spectra and measurement
+
+    def LC_GetSpectrum(self, i_index, i_darkmode, i_integration, i_averaging, i_spectrum):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret, i_spectrum
+        ret = self._valid(i_integration, i_averaging) if i_integration else ERR_SUCCESS
+        if ret != ERR_SUCCESS:
+            return ret, i_spectrum
+        self._integrate(i_integration, i_averaging)
+        frame = self._frame(device, i_integration, i_averaging, i_darkmode)
+        if frame is None:
+            return ERR_INVALID_PARAMETER, i_spectrum
+        return ERR_SUCCESS, frame
+
+    def LC_Measure(self, i_index, i_integration, i_averaging, i_darkmode, i_aux, i_smooth):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        ret = self._valid(i_integration, i_averaging)
+        if ret != ERR_SUCCESS:
+            return ret
+        if i_darkmode not in (1, 2):
+            return ERR_INVALID_PARAMETER
+        start = time.perf_counter()
+        self._integrate(i_integration, i_averaging)
+        counts = self._frame(device, i_integration, i_averaging, i_darkmode)
+        if i_smooth > 1:
+            counts = np.convolve(counts, np.ones(i_smooth) / i_smooth, mode='same')
+        factor = 1.0 / self.fullscale if device.factor is None else device.factor
+        spectrum = counts / i_integration * factor * device.zoom
+        result = {item: float(value[0]) for item, value in self.engine.compute(spectrum).items()}
+        result.update({801: self.wavelength.copy(), 802: spectrum, 901: float(i_integration),
+                       902: float(i_averaging), 903: self._saturation(i_integration),
+                       904: (time.perf_counter() - start) * 1000, 905: 0.0})
+        device.result = result
+        return ERR_SUCCESS
+
+    def LC_MeasureDate(self, i_index, *args):
+        device, ret = self._device(i_index)
+        if len(args) == 1:
+            data = args[0]
+            if device is None or device.result is None:
+                return ret or ERR_INVALID_PARAMETER, data
+            for item, value in device.result.items():
+                if item in _DATA_FIELDS:
+                    setattr(data, _DATA_FIELDS[item], value)
+                elif 32 <= item <= 46:
+                    data.d_CRI[item - 32] = value
+            return ERR_SUCCESS, data
+        item, value, values = args
+        if device is None or device.result is None:
+            return ret or ERR_INVALID_PARAMETER, value, values
+        if item not in device.result:
+            return ERR_INVALID_PARAMETER, value, values
+        if item in (801, 802):
+            return ERR_SUCCESS, value, device.result[item].copy()
+        return ERR_SUCCESS, device.result[item], values
+
+    # Calibration
+
+    def LC_Almp(self, i_index, i_darkmode, i_integration, i_averaging, i_almpsp, i_almpwave):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        if len(i_almpsp) != len(i_almpwave) or len(i_almpsp) < 2:
+            return ERR_INVALID_ARRAY
+        self._integrate(i_integration, i_averaging)
+        counts = self._frame(device, i_integration, i_averaging, i_darkmode)
+        if counts is None:
+            return ERR_INVALID_PARAMETER
+        radiance = np.interp(self.wavelength, np.asarray(i_almpwave, float), np.asarray(i_almpsp, float))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            device.factor = np.nan_to_num(radiance / (counts / i_integration), posinf=0.0, neginf=0.0)
+        return ERR_SUCCESS
+
+    def LC_ReadFbr(self, i_index, i_file):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        if not os.path.exists(i_file):
+            return ERR_FILE_NO_EXIST
+        table = np.loadtxt(i_file, ndmin=2)
+        device.factor = np.interp(self.wavelength, table[:, 0], table[:, 1])
+        return ERR_SUCCESS
+
+    def LC_SaveFbr(self, i_index, i_usagemode, i_path):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        if not os.path.isdir(i_path):
+            return ERR_FILE_NO_EXIST
+        factor = np.full(self.pixels, 1.0 / self.fullscale) if device.factor is None else device.factor
+        np.savetxt(os.path.join(i_path, 'Sp_%s.txt' % device.serialnumber),
+                   np.column_stack((self.wavelength, factor)), delimiter='\t')
+        return ERR_SUCCESS
+
+    def LC_ReadAux(self, i_index, i_file):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        return ERR_SUCCESS if os.path.exists(i_file) else ERR_FILE_NO_EXIST
+
+    def LC_SaveAux(self, i_index, i_path):
+        return self._device(i_index)[1]
+
+    def LC_GetAuxSpectrum(self, i_index, i_auxlmp, i_auxtest):
+        return self._device(i_index)[1]
+
+    def LC_CCT(self, i_index, i_darkmodul, i_integration, i_averaging, i_cct, i_flux):
+        return self._device(i_index)[1]
+
+    def LC_SetZoomFactor(self, i_index, i_factor):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        device.zoom = i_factor
+        return ERR_SUCCESS
+
+    def LC_GetZoomFactor(self, i_index, i_factor):
+        device, ret = self._device(i_index)
+        return ret, device.zoom if device is not None else i_factor
+
+    def LC_SetXYZFactor(self, i_index, i_factorxyz):
+        device, ret = self._device(i_index)
+        if device is None:
+            return ret
+        device.xyz_factor = np.asarray(i_factorxyz, dtype=np.float64)
+        return ERR_SUCCESS
+
+    def LC_GetXYZFactor(self, i_index, i_factorxyz):
+        device, ret = self._device(i_index)
+        return ret, device.xyz_factor.copy() if device is not None else i_factorxyz
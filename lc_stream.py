@@ -0,0 +1,219 @@
+import threading
+import time
+
+import numpy as np
+
+from Py_LcSpvis import BlockingFunctions
+
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+
+FRAME_DTYPE = np.dtype([
+    ('sequence', np.int64),
+    ('timestamp', np.float64),
+    ('integration', np.float64),
+    ('averaging', np.int32),
+    ('saturation', np.float64),
+])
+
+
+class SpectrumStream:
+    """
+    Continuous acquisition with lc_getspectrum into a fixed size ring buffer.
+    A background thread acquires frames while the consumer iterates over the stream. All
+    buffers are allocated when the stream is created, memory stays bounded however long the
+    stream runs.
+    When the ring is full the overflow policy decides what happens:
+    BLOCK - the producer waits for the consumer, no frame is lost.
+    DROP_OLDEST - the oldest unread frame is overwritten.
+    DROP_NEWEST - the newly acquired frame is discarded.
+    Dropped frames are counted in dropped, every frame carries its sequence number, which
+    keeps counting over stop and start, so gaps are visible to the consumer.
+    The saturation of a frame is the maximum of its raw counts (the dark added back for dark
+    subtracted modes) relative to the counts at saturation 1.0 of lc_getsaturation. The dark
+    and the full scale are measured once, when the stream is started the first time.
+    """
+    def __init__(self, i_index, i_darkmode, i_integration, i_averaging, i_capacity=64, i_policy=BLOCK,
+                 i_pixels=None, i_fullscale=None):
+        """
+        :param i_index:  Integer, the selected spectrometer's index
+        :param i_darkmode:  Integer, dark mode selection (see lc_getspectrum)
+        :param i_integration:  Double precision floating-point, integration time
+        :param i_averaging:  Integer, number of averages
+        :param i_capacity:  Integer, number of frames in the ring buffer
+        :param i_policy:  BLOCK, DROP_OLDEST or DROP_NEWEST
+        :param i_pixels:  Integer, number of pixels. Read with lc_getparameters if None.
+        :param i_fullscale:  Double, raw counts corresponding to saturation 1.0. Derived
+        from lc_getsaturation and a raw frame if None.
+        """
+        if i_policy not in (BLOCK, DROP_OLDEST, DROP_NEWEST):
+            raise ValueError('Unknown overflow policy %r' % i_policy)
+        if i_pixels is None:
+            ret, pixels = BlockingFunctions.lc_getparameters(i_index, 1, '')
+            if ret != 0:
+                raise RuntimeError('lc_getparameters failed with %d' % ret)
+            i_pixels = int(float(pixels))
+        self.index = i_index
+        self.darkmode = i_darkmode
+        self.integration = i_integration
+        self.averaging = i_averaging
+        self.policy = i_policy
+        self.fullscale = i_fullscale
+        self.capacity = i_capacity
+
+        self.spectra = np.zeros((i_capacity, i_pixels), dtype=np.float64)
+        self.frames = np.zeros(i_capacity, dtype=FRAME_DTYPE)
+        self._staging = np.zeros(i_pixels, dtype=np.float64)
+        self._output = np.zeros(i_pixels, dtype=np.float64)
+        self._dark = None
+        self._head = 0
+        self._tail = 0
+        self._sequence = 0
+
+        self.produced = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.error = 0
+
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def __len__(self):
+        return self._tail - self._head
+
+    def _reference(self):
+        """
+        Measure the dark added back to dark subtracted frames and the full scale counts.
+        :return:  Return code of the first failing call, 0 otherwise.
+        """
+        ret, raw = BlockingFunctions.lc_getspectrum_np(self.index, 0, self.integration, self.averaging)
+        if ret != 0:
+            return ret
+        raw = raw.copy()
+        self._dark = np.zeros_like(raw)
+        if self.darkmode != 0:
+            ret, subtracted = BlockingFunctions.lc_getspectrum_np(self.index, self.darkmode, self.integration,
+                                                                  self.averaging, self._staging)
+            if ret != 0:
+                return ret
+            np.subtract(raw, subtracted, out=self._dark)
+        if self.fullscale is None:
+            ret, saturation = BlockingFunctions.lc_getsaturation(self.index, self.integration, self.averaging, 0.0)
+            if ret != 0:
+                return ret
+            if saturation <= 0:
+                return -13  # ERR_INVALID_SATURATION
+            self.fullscale = raw.max() / saturation
+        return 0
+
+    def start(self):
+        """
+        Start the background acquisition.
+        :return:  The stream. A failing reference measurement (see the class docstring)
+        leaves it stopped with the return code in error.
+        """
+        with self._condition:
+            if self._running:
+                return self
+        if self._dark is None:
+            ret = self._reference()
+            if ret != 0:
+                self.error = ret
+                self._dark = None
+                return self
+        with self._condition:
+            self._running = True
+        self._thread = threading.Thread(target=self._produce, name='LcSpvis-stream-%d' % self.index, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the background acquisition. Frames already in the ring can still be read.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _produce(self):
+        while True:
+            ret, spectrum = BlockingFunctions.lc_getspectrum_np(self.index, self.darkmode, self.integration,
+                                                                self.averaging, self._staging)
+            timestamp = time.time()
+            with self._condition:
+                if not self._running:
+                    return
+                if ret != 0:
+                    self.error = ret
+                    self._running = False
+                    self._condition.notify_all()
+                    return
+                self.produced += 1
+                if self._tail - self._head == self.capacity:
+                    if self.policy == BLOCK:
+                        while self._running and self._tail - self._head == self.capacity:
+                            self._condition.wait()
+                        if not self._running:
+                            return
+                    elif self.policy == DROP_OLDEST:
+                        self._head += 1
+                        self.dropped += 1
+                    else:
+                        self.dropped += 1
+                        self._sequence += 1
+                        continue
+                slot = self._tail % self.capacity
+                self.spectra[slot] = spectrum
+                np.add(spectrum, self._dark, out=self._staging)
+                self.frames[slot] = (self._sequence, timestamp, self.integration, self.averaging,
+                                     self._staging.max() / self.fullscale)
+                self._tail += 1
+                self._sequence += 1
+                self._condition.notify_all()
+
+    def get(self, i_timeout=None):
+        """
+        Take the oldest unread frame.
+        :param i_timeout:  Seconds to wait for a frame, forever if None.
+        :return:  Tuple (spectrum, frame metadata record) or None when the timeout expired or
+        the stream is stopped and empty. The spectrum array is reused by the next call.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._tail > self._head or not self._running, i_timeout):
+                return None
+            if self._tail == self._head:
+                return None
+            slot = self._head % self.capacity
+            self._output[:] = self.spectra[slot]
+            frame = self.frames[slot].copy()
+            self._head += 1
+            self.consumed += 1
+            self._condition.notify_all()
+        return self._output, frame
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            yield item
+
+    def statistics(self):
+        """
+        :return:  Dictionary with produced, consumed, dropped and buffered frame counts.
+        """
+        with self._condition:
+            return {'produced': self.produced, 'consumed': self.consumed, 'dropped': self.dropped,
+                    'buffered': self._tail - self._head}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Py_LcSpvis
+import lc_simulator
+
+
+@pytest.fixture
+def simulator():
+    """
+    Py_LcSpvis routed to an initialized simulator without integration sleeps.
+    """
+    simulator = Py_LcSpvis.use_backend(lc_simulator.Simulator(i_devices=2, i_pixels=256, i_timescale=0.0))
+    Py_LcSpvis.BlockingFunctions.lc_init()
+    yield simulator
+    Py_LcSpvis.BlockingFunctions.lc_doneall()
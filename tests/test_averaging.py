@@ -0,0 +1,24 @@
+import numpy as np
+
+from lc_averaging import AdaptiveAveraging, PIXEL
+
+
+def test_stops_at_target(simulator):
+    averaging = AdaptiveAveraging(i_target=0.05, i_mode=PIXEL, i_maxframes=50)
+    ret, spectrum = averaging.acquire(0, 0, 5.0)
+    assert ret == 0
+    assert spectrum.shape == (256,)
+    assert 2 <= averaging.frames <= 50
+    assert averaging.frames == 50 or averaging.error <= 0.05
+    assert averaging.statistics()['acquisitions'] == 1
+
+
+def test_failed_acquisition_is_counted(simulator):
+    averaging = AdaptiveAveraging()
+    ret, spectrum = averaging.acquire(99, 0, 5.0)
+    assert ret != 0
+    assert spectrum is None
+    assert averaging.frames == 0
+    assert np.isnan(averaging.error)
+    assert averaging.statistics()['acquisitions'] == 1
+
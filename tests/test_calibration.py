@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+import lc_calibration
+from lc_calibration import Calibration
+
+
+def test_derive_inverts_the_model():
+    wavelength = np.linspace(400.0, 700.0, 31)
+    radiance = np.linspace(1.0, 2.0, 31)
+    counts = np.linspace(100.0, 400.0, 31)
+    counts[5] = 0.0
+    factor = lc_calibration.derive(wavelength, np.stack([counts * 0.9, counts * 1.1]), 20.0, radiance, wavelength)
+    expected = np.zeros(31)
+    expected[counts > 0] = radiance[counts > 0] / (counts[counts > 0] / 20.0)
+    np.testing.assert_allclose(factor, expected)
+    with pytest.raises(ValueError):
+        lc_calibration.derive(wavelength, counts, 20.0, radiance[:3], wavelength)
+
+
+def test_apply():
+    wavelength = np.linspace(400.0, 700.0, 4)
+    calibration = Calibration(wavelength, [1.0, 2.0, 3.0, 4.0], i_zoom=2.0)
+    raw = np.array([[10.0, 10.0, 10.0, 10.0], [20.0, 20.0, 20.0, 20.0]])
+    np.testing.assert_allclose(calibration.apply(raw, 10.0, 2.0), [[1.6, 3.2, 4.8, 6.4], [3.6, 7.2, 10.8, 14.4]])
+    np.testing.assert_allclose(calibration.apply(raw, [10.0, 20.0]), [[2, 4, 6, 8], [2, 4, 6, 8]])
+    calibration.apply(raw, 10.0, np.array([0.0, 0.0, 0.0, 10.0]), i_out=raw)
+    np.testing.assert_allclose(raw, [[2, 4, 6, 0], [4, 8, 12, 8]])
+    resampled = Calibration(wavelength, [1.0, 3.0], i_factorwavelength=[400.0, 700.0])
+    np.testing.assert_allclose(resampled.factor, [1.0, 5 / 3, 7 / 3, 3.0])
+    with pytest.raises(ValueError):
+        Calibration(wavelength, [1.0, 2.0])
+
+
+def test_table_cache_follows_the_modification_time(tmp_path):
+    path = lc_calibration.write_table(str(tmp_path), 'A1', [400.0, 500.0, 600.0], [1.0, 2.0, 3.0])
+    wavelength, factor = lc_calibration.read_table(path)
+    assert lc_calibration.read_table(path)[1] is factor
+    with pytest.raises(ValueError):
+        factor[0] = 0.0
+    lc_calibration.write_table(str(tmp_path), 'A1', [400.0, 500.0, 600.0], [4.0, 5.0, 6.0])
+    modified = os.stat(path).st_mtime_ns + 1000000
+    os.utime(path, ns=(modified, modified))
+    assert lc_calibration.read_table(path)[1].tolist() == [4.0, 5.0, 6.0]
+    calibration = Calibration.from_serialnumber(str(tmp_path), 'A1', [450.0, 550.0])
+    np.testing.assert_allclose(calibration.factor, [4.5, 5.5])
+
+
+@pytest.mark.parametrize('content', ['400\t1\t9\n500\t2\t9\n', '400\t1\n', '500\t1\n400\t2\n', '400\t1\n400\t2\n',
+                                     '400\tgain\n500\t2\n'])
+def test_malformed_tables_are_rejected(tmp_path, content):
+    path = tmp_path / 'Sp_B2.txt'
+    path.write_text(content)
+    with pytest.raises(ValueError, match='Sp_B2.txt'):
+        lc_calibration.read_table(str(path))
+
+
+def test_compare():
+    recorded = np.array([[0.0, 5.0, 10.0], [0.0, 0.0, 0.0]])
+    calibrated = recorded + [[0.0, 0.1, -0.2], [0.0, 0.3, 0.0]]
+    absolute, relative = lc_calibration.compare(calibrated, recorded)
+    assert absolute == pytest.approx(0.3)
+    assert relative == pytest.approx(0.02)
+    with pytest.raises(ValueError):
+        lc_calibration.compare(calibrated[:, :2], recorded)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import lc_colorimetry
+
+
+def _illuminants():
+    wavelength, values = lc_colorimetry.default_table('illuminants')
+    return lc_colorimetry.get_engine(wavelength), values.T
+
+
+@pytest.mark.parametrize('column, x, y, cct', [(0, 0.44757, 0.40745, 2856), (1, 0.31272, 0.32903, 6504)])
+def test_standard_illuminants(column, x, y, cct):
+    engine, spectra = _illuminants()
+    results = engine.compute(spectra[column], (5, 6, 11))
+    assert results[5][0] == pytest.approx(x, abs=5e-5)
+    assert results[6][0] == pytest.approx(y, abs=5e-5)
+    assert results[11][0] == pytest.approx(cct, abs=1)
+
+
+def test_fluorescent_ra():
+    engine, spectra = _illuminants()
+    ra = engine.compute(spectra[2:], (31,))[31]
+    assert np.round(ra).tolist() == [64, 90, 83]
+
+
+def test_cri_items_by_default():
+    engine, spectra = _illuminants()
+    results = engine.compute(spectra[2], lc_colorimetry.COLORIMETRY_ITEMS)
+    assert all(np.isfinite(results[item][0]) for item in range(31, 47))
+
+
+def test_empty_batch():
+    engine, spectra = _illuminants()
+    results = engine.compute(spectra[:0])
+    assert set(results) == set(lc_colorimetry.COLORIMETRY_ITEMS)
+    assert all(values.shape == (0,) for values in results.values())
+
+
+def _led(i_wavelength, i_peak):
+    return np.exp(-0.5 * ((i_wavelength - i_peak) / 2.0) ** 2)
+
+
+def test_dominant_wavelength_of_narrow_leds():
+    wavelength = np.linspace(340, 1000, 2048)
+    engine = lc_colorimetry.get_engine(wavelength)
+    peaks = np.array([420.0, 470.0, 530.0, 590.0, 660.0])
+    results = engine.compute(_led(wavelength, peaks[:, None]), (19, 20))
+    assert results[19].tolist() == [1.0] * 5
+    assert np.abs(results[20] - peaks).max() < 1.0
+
+
+def test_analytic_fit_is_nan_outside_its_range():
+    wavelength = np.linspace(340, 1000, 2048)
+    engine = lc_colorimetry.get_engine(wavelength, lc_colorimetry.ANALYTIC)
+    results = engine.compute(_led(wavelength, np.array([[420.0], [530.0], [660.0]])), (19, 20, 21))
+    assert np.isnan(results[20][[0, 2]]).all()
+    assert results[20][1] == pytest.approx(530.0, abs=1.0)
+
+
+def test_engine_cache_keyed_by_table_contents():
+    wavelength = np.linspace(380, 780, 81)
+    table = (np.array([380.0, 780.0]), np.ones((2, 3)))
+    first = lc_colorimetry.get_engine(wavelength, table)
+    assert lc_colorimetry.get_engine(wavelength, (table[0].copy(), table[1].copy())) is first
+    changed = lc_colorimetry.get_engine(wavelength, (table[0], table[1] * 2))
+    assert changed is not first
+    assert not np.array_equal(changed.cmf, first.cmf)
@@ -0,0 +1,22 @@
+import Py_LcSpvis
+from lc_exposure import AutoExposure
+
+
+def test_converges_and_warm_starts(simulator):
+    exposure = AutoExposure(0.5, i_tolerance=0.02)
+    ret, integration, averaging = exposure.autointegration(0, 'product')
+    assert ret == 0
+    ret, saturation = Py_LcSpvis.BlockingFunctions.lc_getsaturation(0, integration, 1, 0.0)
+    assert abs(saturation - 0.5) <= 0.01
+    assert exposure.autointegration(0, 'product')[1] == integration
+    assert exposure.probes == 1
+
+
+def test_high_target_treats_full_scale_as_clipped(simulator):
+    # Default clip 1.25 x 0.9 is above full scale, the simulator saturates at 1.0.
+    exposure = AutoExposure(0.9, i_tolerance=0.02, i_start=1000.0)
+    assert exposure.clip == 1.0
+    ret, integration, averaging = exposure.autointegration(0)
+    assert ret == 0
+    assert abs(simulator.offset + simulator.brightness * integration - 0.9) <= 0.018
+
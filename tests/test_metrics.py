@@ -0,0 +1,45 @@
+import Py_LcSpvis
+import lc_metrics
+from lc_metrics import BUCKETS, Metrics
+
+
+def test_enable_and_disable_restore_the_originals(simulator):
+    originals = dict(vars(Py_LcSpvis.BlockingFunctions))
+    metrics = lc_metrics.enable(Metrics())
+    try:
+        assert lc_metrics.enabled()
+        assert vars(Py_LcSpvis.BlockingFunctions)['lc_measure'] is not originals['lc_measure']
+        lc_metrics.enable(metrics)
+    finally:
+        lc_metrics.disable()
+    assert not lc_metrics.enabled()
+    assert dict(vars(Py_LcSpvis.BlockingFunctions)) == originals
+
+
+def test_keyword_calls_keep_the_device_index(simulator):
+    metrics = lc_metrics.enable(Metrics())
+    try:
+        functions = Py_LcSpvis.BlockingFunctions
+        functions.lc_measure(i_index=1, i_integration=10, i_averaging=1, i_darkmode=1, i_aux=False, i_smooth=0)
+        functions.lc_getsaturation(i_ndex=1, i_integration=10, i_averaging=1, i_saturation=0.0)
+        functions.lc_measuredate(1, i_mpitestdataitem=904, i_data=0, i_datearray=[])
+    finally:
+        lc_metrics.disable()
+    assert set(metrics.calls) == {('lc_measure', 1), ('lc_getsaturation', 1), ('lc_measuredate', 1)}
+    assert metrics.test_time[1].count == 1
+
+
+def test_openmetrics_exposition():
+    metrics = Metrics()
+    metrics.record('lc_measure', (0,), BUCKETS[0] / 2, 0)
+    metrics.record('lc_measure', (0,), BUCKETS[2], 0)
+    metrics.record('lc_measure', (0,), BUCKETS[-1] * 2, -5)
+    text = metrics.openmetrics()
+    lines = text.splitlines()
+    assert text.endswith('\n# EOF\n')
+    buckets = [int(line.rsplit(' ', 1)[1]) for line in lines if line.startswith('lcspvis_call_seconds_bucket')]
+    assert buckets == [1, 1] + [2] * (len(BUCKETS) - 2) + [3]
+    assert 'lcspvis_call_seconds_bucket{function="lc_measure",index="0",le="+Inf"} 3' in lines
+    assert 'lcspvis_call_seconds_count{function="lc_measure",index="0"} 3' in lines
+    assert '# TYPE lcspvis_errors counter' in lines
+    assert 'lcspvis_errors_total{function="lc_measure",index="0",code="-5"} 1' in lines
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from lc_pipeline import Pipeline
+
+
+def test_processes_every_frame(simulator):
+    pipeline = Pipeline(0, 10, 1, 1, lambda result, spectrum: spectrum.size)
+    assert pipeline.run(5) == [256] * 5
+    assert pipeline.error == 0
+    assert pipeline.statistics()['frames'] == 5
+
+
+def test_library_error_shortens_the_result(simulator):
+    original = simulator.LC_Measure
+    calls = []
+
+    def failing(*args):
+        calls.append(args)
+        return -7 if len(calls) == 3 else original(*args)
+
+    simulator.LC_Measure = failing
+    pipeline = Pipeline(0, 10, 1, 1, lambda result, spectrum: 1)
+    assert pipeline.run(5) == [1, 1]
+    assert pipeline.error == -7
+
+
+def test_acquisition_exception_is_raised(simulator):
+    original = simulator.LC_Measure
+    calls = []
+
+    def failing(*args):
+        calls.append(args)
+        if len(calls) == 3:
+            raise RuntimeError('device lost')
+        return original(*args)
+
+    simulator.LC_Measure = failing
+    outputs = []
+    pipeline = Pipeline(0, 10, 1, 1, lambda result, spectrum: outputs.append(1))
+    with pytest.raises(RuntimeError, match='device lost'):
+        pipeline.run(5)
+    assert len(outputs) == 2
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('LcSpvis-pipeline')]
+
+
+def test_processing_exception_stops_the_acquisition(simulator):
+    original = simulator.LC_Measure
+    calls = []
+
+    def counting(*args):
+        calls.append(args)
+        return original(*args)
+
+    def process(result, spectrum):
+        raise ValueError('bad frame')
+
+    simulator.LC_Measure = counting
+    pipeline = Pipeline(0, 10, 1, 1, process)
+    with pytest.raises(ValueError, match='bad frame'):
+        pipeline.run(50)
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('LcSpvis-pipeline')]
+    # The frame being processed plus at most one per other slot.
+    assert len(calls) <= len(pipeline.slots)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import lc_processing
+
+
+@pytest.fixture
+def spectra():
+    generator = np.random.default_rng(7)
+    wavelength = np.linspace(380.0, 780.0, 200)
+    lines = np.exp(-0.5 * ((wavelength - generator.uniform(450, 700, (4, 1))) / 8.0) ** 2)
+    return wavelength, lines + generator.normal(0.0, 0.01, lines.shape)
+
+
+def test_resampler_matches_interp(spectra):
+    wavelength, values = spectra
+    grid = np.arange(370.0, 791.0, 0.7)
+    resampled = lc_processing.get_resampler(wavelength, grid)(values)
+    inside = (grid >= wavelength[0]) & (grid <= wavelength[-1])
+    for row, spectrum in zip(resampled, values):
+        np.testing.assert_allclose(row[inside], np.interp(grid[inside], wavelength, spectrum), atol=1e-12)
+        assert not row[~inside].any()
+    assert lc_processing.get_resampler(wavelength, grid) is lc_processing.get_resampler(wavelength.copy(), grid)
+
+
+@pytest.mark.parametrize('window', [1, 5, 11])
+def test_rolling_matches_convolution(spectra, window):
+    values = spectra[1]
+    half = window // 2
+    expected = [np.convolve(np.pad(spectrum, half, mode='edge'), np.ones(window) / window, mode='valid')
+                for spectrum in values]
+    np.testing.assert_allclose(lc_processing.rolling(values, window), expected, atol=1e-12)
+
+
+@pytest.mark.parametrize('window, order', [(7, 2), (11, 3)])
+def test_savgol_matches_polyfit(spectra, window, order):
+    spectrum = spectra[1][0]
+    smoothed = lc_processing.savgol(spectrum, window, order)[0]
+    pixels = np.arange(len(spectrum))
+    half = window // 2
+    for pixel in (half, 50, len(spectrum) - half - 1):
+        around = slice(pixel - half, pixel + half + 1)
+        fit = np.polyfit(pixels[around], spectrum[around], order)
+        assert smoothed[pixel] == pytest.approx(np.polyval(fit, pixel), abs=1e-9)
+    first = np.polyfit(pixels[:window], spectrum[:window], order)
+    last = np.polyfit(pixels[-window:], spectrum[-window:], order)
+    np.testing.assert_allclose(smoothed[:half], np.polyval(first, pixels[:half]), atol=1e-9)
+    np.testing.assert_allclose(smoothed[-half:], np.polyval(last, pixels[-half:]), atol=1e-9)
+
+
+def test_baseline(spectra):
+    wavelength, values = spectra
+    position = np.linspace(-1.0, 1.0, len(wavelength))
+    single = lc_processing.baseline(values, 2, 1)
+    for row, spectrum in zip(single, values):
+        np.testing.assert_allclose(row, np.polyval(np.polyfit(position, spectrum, 2), position), atol=1e-9)
+    lines = np.exp(-0.5 * ((wavelength - np.array([[500.0], [600.0], [690.0]])) / 8.0) ** 2)
+    slope = 0.2 + 0.1 * position - 0.05 * position ** 2
+    error = np.abs(lc_processing.baseline(lines + slope, 2, 20) - slope)
+    assert np.median(error, axis=1).max() < 0.02
+    assert error.max() < np.abs(lc_processing.baseline(lines + slope, 2, 1) - slope).max()
+
+def test_peaks(spectra):
+    wavelength, values = spectra
+    chunked = lc_processing.peaks(values, wavelength, i_chunk=3)
+    whole = lc_processing.peaks(values, wavelength)
+    assert set(chunked) == set(range(13, 19))
+    for item in chunked:
+        np.testing.assert_array_equal(chunked[item], whole[item])
+    empty = lc_processing.peaks(values[:0], wavelength)
+    assert set(empty) == set(range(13, 19))
+    assert all(array.shape == (0,) for array in empty.values())
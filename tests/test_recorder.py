@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+import lc_recorder
+
+
+def _fill(i_path, i_timestamps, i_serials, i_flush=4):
+    with lc_recorder.Recorder(i_path, i_pixels=8, i_items=(5, 6), i_flush=i_flush) as recorder:
+        for timestamp, serial in zip(i_timestamps, i_serials):
+            recorder.append(serial, np.full(8, timestamp), {5: timestamp}, i_timestamp=timestamp)
+    return recorder
+
+
+def test_index_is_persisted_and_used(tmp_path):
+    path = str(tmp_path / 'store')
+    serials = ['A', 'A', 'B', 'B', 'B', 'A', 'C', 'A', 'A', 'B']
+    _fill(path, np.arange(10.0), serials)
+    times, runs = lc_recorder._read_index(path, 10)
+    assert runs['serial'].tolist() == [0, 1, 0, 2, 0, 1]
+    reader = lc_recorder.Reader(path)
+    assert reader.ordered
+    assert reader.time_range(2.5, 7.0) == slice(3, 7)
+    assert reader.serial_records('A').tolist() == [0, 1, 5, 7, 8]
+    assert reader.serial_records('B').tolist() == [2, 3, 4, 9]
+    assert reader.serial_records('D').tolist() == []
+
+
+def test_appending_to_existing_store_extends_index(tmp_path):
+    path = str(tmp_path / 'store')
+    _fill(path, [0.0, 1.0, 2.0], ['A', 'A', 'B'])
+    _fill(path, [3.0, 4.0], ['B', 'A'])
+    times, runs = lc_recorder._read_index(path, 5)
+    assert runs[['start', 'stop']].tolist() == [(0, 2), (2, 4), (4, 5)]
+    assert lc_recorder.Reader(path).serial_records('B').tolist() == [2, 3]
+
+
+def test_clock_set_back(tmp_path):
+    path = str(tmp_path / 'store')
+    _fill(path, [10.0, 11.0, 5.0, 12.0, 6.0], ['A'] * 5, i_flush=2)
+    assert lc_recorder._read_index(path, 5) is not None
+    reader = lc_recorder.Reader(path)
+    assert not reader.ordered
+    assert reader.time_range(5.0, 11.0).tolist() == [0, 2, 4]
+    assert reader.times['record'].tolist() == [2, 4, 0, 1, 3]
+
+
+def test_recover_truncates_to_complete_records(tmp_path):
+    path = str(tmp_path / 'store')
+    _fill(path, np.arange(6.0), ['A', 'A', 'A', 'B', 'B', 'B'])
+    item = os.path.join(path, lc_recorder._item_file(6))
+    with open(item, 'r+b') as file:
+        file.truncate(4 * 8 + 3)
+    recorder = lc_recorder.Recorder(path)
+    assert recorder.count == 4
+    assert all(os.path.getsize(os.path.join(path, name)) == 4 * np.dtype(dtype).itemsize * size
+               for name, dtype, size in lc_recorder._columns(recorder.header))
+    recorder.append('B', np.ones(8), {}, i_timestamp=10.0)
+    recorder.close()
+    reader = lc_recorder.Reader(path)
+    assert len(reader) == 5
+    assert reader.serial_records('B').tolist() == [3, 4]
+    assert reader.time_range(3.0, 11.0) == slice(3, 5)
+    assert reader.record(4)['timestamp'] == 10.0
+
+
+def test_reader_without_matching_index(tmp_path):
+    path = str(tmp_path / 'store')
+    _fill(path, np.arange(4.0), ['A', 'B', 'B', 'A'])
+    os.remove(os.path.join(path, lc_recorder._SERIAL_INDEX))
+    reader = lc_recorder.Reader(path)
+    assert reader.serial_records('B').tolist() == [1, 2]
+    assert reader.time_range(1.0, 3.0) == slice(1, 3)
@@ -0,0 +1,107 @@
+import threading
+
+import numpy as np
+import pytest
+
+import Py_LcSpvis
+import lc_server
+
+
+@pytest.fixture
+def server(simulator, tmp_path):
+    server = lc_server.Server(str(tmp_path / 'lcspvis.sock'), i_slots=4)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    with lc_server.Client(server.path) as client:
+        yield client
+
+
+def test_calls_and_arrays(client):
+    assert client.lc_init() == 2
+    ret, spectrum = client.lc_getspectrum_np(0, 1, 10.0, 1)
+    assert ret == 0
+    assert spectrum.shape == (256,)
+    assert client.lc_measure(0, 10.0, 1, 1, False, 0) == 0
+    ret, result = client.lc_measuredateall(0)
+    assert ret == 0
+    assert len(result.spectrum) == 256
+
+
+def test_unpicklable_result_does_not_kill_the_worker(simulator, client):
+    original = simulator.LC_GetList
+
+    def unpicklable(*args):
+        raise ValueError(lambda: None)
+
+    simulator.LC_GetList = unpicklable
+    with pytest.raises(RuntimeError):
+        client.lc_getlist(0, '')
+    simulator.LC_GetList = lambda *args: (0, lambda: None)
+    with pytest.raises(RuntimeError):
+        client.lc_getlist(0, '')
+    simulator.LC_GetList = original
+    assert client.lc_getlist(0, '') == original(0, '')
+
+
+def test_out_argument_is_filled(client):
+    out = np.zeros(256)
+    ret, spectrum = client.lc_getspectrum_np(0, 1, 10.0, 1, out)
+    assert ret == 0
+    assert np.shares_memory(spectrum, out)
+    assert out.any()
+    client.lc_measure(0, 10.0, 1, 1, False, 0)
+    wavelength = np.zeros(256)
+    ret, values = client.lc_measuredate_np(0, 801, i_out=wavelength)
+    assert np.shares_memory(values, wavelength)
+    assert wavelength[0] == 340.0
+    with pytest.raises(ValueError):
+        client.lc_getspectrum_np(0, 1, 10.0, 1, np.zeros(10))
+    with pytest.raises(TypeError):
+        client.lc_getlist(0, '', i_out=out)
+
+
+def test_keyword_arguments(client):
+    client.lc_measure(i_index=0, i_integration=10.0, i_averaging=1, i_darkmode=1, i_aux=False, i_smooth=0)
+    ret, result = client.lc_measuredateall(0, i_items=[5, 6])
+    assert ret == 0
+    assert result == Py_LcSpvis.BlockingFunctions.lc_measuredateall(0, i_items=[5, 6])[1]
+    assert client.lc_getsaturation(i_ndex=0, i_integration=10.0, i_averaging=1, i_saturation=0.0)[0] == 0
+    with pytest.raises(TypeError):
+        client.lc_measuredateall(0, i_item=[5])
+
+
+class _Connection:
+    def __init__(self, i_name, i_order):
+        self.name = i_name
+        self.order = i_order
+
+    def reply(self, i_value):
+        self.order.append(self.name)
+
+
+def test_device_serves_connections_round_robin(simulator):
+    release = threading.Event()
+    original = simulator.LC_GetList
+
+    def blocking(*args):
+        release.wait(5)
+        return original(*args)
+
+    simulator.LC_GetList = blocking
+    order = []
+    first, second = _Connection('a', order), _Connection('b', order)
+    device = lc_server._Device(0)
+    for _ in range(4):
+        device.submit(first, 'lc_getlist', (0, ''))
+    device.submit(second, 'lc_getlist', (0, ''))
+    release.set()
+    for _ in range(500):
+        if len(order) == 5:
+            break
+        threading.Event().wait(0.01)
+    assert order in (['a', 'a', 'b', 'a', 'a'], ['a', 'b', 'a', 'a', 'a'])
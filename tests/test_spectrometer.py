@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import Py_LcSpvis
+
+
+def test_handles_of_one_index_share_the_lock(simulator):
+    first = Py_LcSpvis.Spectrometer.discover()
+    second = Py_LcSpvis.Spectrometer.discover()
+    assert [spectrometer.index for spectrometer in first] == [0, 1]
+    assert first[0].lock is second[0].lock
+    assert first[0].lock is not first[1].lock
+
+
+def test_async_calls_wait_for_the_handle(simulator):
+    spectrometer = Py_LcSpvis.Spectrometer(0)
+    results = []
+
+    def run():
+        results.append(asyncio.run(Py_LcSpvis.AsyncFunctions.lc_oncedark(0, 10, 1)))
+
+    try:
+        with spectrometer.lock:
+            thread = threading.Thread(target=run)
+            thread.start()
+            thread.join(0.2)
+            assert thread.is_alive()
+        thread.join(5)
+        assert results == [0]
+    finally:
+        Py_LcSpvis.AsyncFunctions.shutdown()
+
+
+class _Helper(Py_LcSpvis.DeviceLocks):
+    def __init__(self):
+        self.lock = threading.Lock()
+
+
+def test_device_locks_serialize_one_device_only():
+    helper = _Helper()
+    assert helper.device_lock(0) is helper.device_lock(0)
+    assert _Helper().device_lock(0) is not helper.device_lock(0)
+    acquired = {}
+
+    def acquire(i_index):
+        lock = helper.device_lock(i_index)
+        acquired[i_index] = lock.acquire(timeout=0.1)
+        if acquired[i_index]:
+            lock.release()
+
+    with helper.device_lock(0):
+        for index in (0, 1):
+            thread = threading.Thread(target=acquire, args=(index,))
+            thread.start()
+            thread.join()
+    assert acquired == {0: False, 1: True}
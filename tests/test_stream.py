@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+
+from lc_stream import SpectrumStream, BLOCK, DROP_OLDEST, DROP_NEWEST
+
+
+def _wait_full(i_stream):
+    deadline = time.monotonic() + 5
+    while len(i_stream) < i_stream.capacity or i_stream.produced <= i_stream.capacity + 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_block_loses_no_frame(simulator):
+    stream = SpectrumStream(0, 1, 10.0, 1, i_capacity=4, i_policy=BLOCK).start()
+    sequences = []
+    for _ in range(20):
+        spectrum, frame = stream.get(5)
+        sequences.append(frame['sequence'])
+        time.sleep(0.001)
+    stream.stop()
+    assert sequences == list(range(20))
+    assert stream.dropped == 0
+
+
+def test_drop_oldest_keeps_newest_frames(simulator):
+    stream = SpectrumStream(0, 1, 10.0, 1, i_capacity=4, i_policy=DROP_OLDEST).start()
+    _wait_full(stream)
+    stream.stop()
+    sequences = [frame['sequence'] for _, frame in stream]
+    assert len(sequences) == 4
+    assert sequences == list(range(sequences[0], sequences[0] + 4))
+    assert sequences[0] > 0
+    assert stream.dropped == stream.produced - 4
+
+
+def test_drop_newest_keeps_first_frames(simulator):
+    stream = SpectrumStream(0, 1, 10.0, 1, i_capacity=4, i_policy=DROP_NEWEST).start()
+    _wait_full(stream)
+    stream.stop()
+    sequences = [frame['sequence'] for _, frame in stream]
+    assert sequences == [0, 1, 2, 3]
+    assert stream.dropped == stream.produced - 4
+
+
+def test_sequence_continues_after_restart(simulator):
+    stream = SpectrumStream(0, 1, 10.0, 1, i_capacity=4, i_policy=BLOCK).start()
+    first = [stream.get(5)[1]['sequence'] for _ in range(3)]
+    stream.stop()
+    last = max(first + [frame['sequence'] for _, frame in stream])
+    stream.start()
+    following = stream.get(5)[1]['sequence']
+    stream.stop()
+    assert first == [0, 1, 2]
+    assert following == last + 1
+
+
+def test_saturation_matches_lc_getsaturation(simulator):
+    stream = SpectrumStream(0, 1, 10.0, 1, i_capacity=4).start()
+    spectrum, frame = stream.get(5)
+    stream.stop()
+    expected = simulator.offset + simulator.brightness * 10.0
+    assert np.isclose(frame['saturation'], expected, rtol=0.02)
+    assert spectrum.max() / simulator.fullscale < expected - simulator.offset / 2